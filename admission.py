@@ -0,0 +1,74 @@
+"""Limits of simultaneously processed connections and requests."""
+
+from config import MAX_CONNECTIONS, MAX_INFLIGHT_VALIDATIONS, BUSY_COMMENT, ResponsePhrase
+from parse_data import forms_response_chunks
+
+
+BUSY_RESPONSE = forms_response_chunks((ResponsePhrase.BUSY, BUSY_COMMENT))
+PHASES = ('read', 'validate', 'storage', 'write')
+
+
+class AdmissionControl:
+    """Counts served connections and validations, rejects them over the limits.
+
+    Rejected work is answered at once with busy response instead of waiting
+    in a queue, so slow clients or validation server can't pile up memory.
+
+    Args:
+        max_connections(int): Max simultaneously served client connections.
+        max_validations(int): Max requests waiting for validation server verdict.
+
+    """
+
+    def __init__(self, max_connections: int = MAX_CONNECTIONS,
+                 max_validations: int = MAX_INFLIGHT_VALIDATIONS):
+        self.max_connections, self.max_validations = max_connections, max_validations
+        self.connections, self.validations = 0, 0
+        self.rejected = {'connections': 0, 'validations': 0, 'oversized': 0}
+        self.rejected_open = 0  # Rejected connections which are not closed yet.
+        self.timeouts = dict.fromkeys(PHASES, 0)
+
+    def open_connection(self) -> bool:
+        """Take connection slot, return False if there is no free one."""
+        if self.connections >= self.max_connections:
+            self.rejected['connections'] += 1
+            self.rejected_open += 1
+            return False
+        self.connections += 1
+        return True
+
+    def close_connection(self) -> None:
+        """Free connection slot."""
+        self.connections -= 1
+
+    def close_rejected(self) -> None:
+        """Count closing of connection rejected by open_connection()."""
+        self.rejected_open -= 1
+
+    def start_validation(self) -> bool:
+        """Take validation slot, return False if there is no free one."""
+        if self.validations >= self.max_validations:
+            self.rejected['validations'] += 1
+            return False
+        self.validations += 1
+        return True
+
+    def finish_validation(self) -> None:
+        """Free validation slot."""
+        self.validations -= 1
+
+    def oversized(self) -> None:
+        """Count request rejected by size."""
+        self.rejected['oversized'] += 1
+
+    def timeout(self, phase: str) -> None:
+        """Count timeout of request processing phase from PHASES."""
+        self.timeouts[phase] += 1
+
+    def stats(self) -> dict:
+        """Return current load and rejections counters."""
+        return {'connections': self.connections, 'validations': self.validations,
+                'rejected_open': self.rejected_open, 'rejected': dict(self.rejected), 'timeouts': dict(self.timeouts)}
+
+
+admission = AdmissionControl()
@@ -0,0 +1 @@
+"""Benchmarks of RKSOK server parts, run from the repository root: python -m benchmarks.<name>."""
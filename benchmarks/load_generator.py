@@ -0,0 +1,252 @@
+"""Asyncio load generator for RKSOK server.
+
+Requests are composed by compose_request() of RKSOKPhoneBook, so they are
+framed like the ones of the real client. Every simulated client sends requests one by one,
+through a new connection per request or through one persistent connection.
+
+Run: python -m benchmarks.load_generator ADDR PORT [options], see --help.
+"""
+
+import argparse
+import asyncio
+from bisect import bisect_left
+from dataclasses import dataclass, field
+import itertools
+import random
+import time
+from typing import Optional
+
+from rksok_client import RequestVerb, compose_request
+
+
+VERB_MIX = {RequestVerb.GET: 0.8, RequestVerb.WRITE: 0.15, RequestVerb.DELETE: 0.05}
+
+
+@dataclass
+class LoadConfig:
+    """Parameters of generated load."""
+
+    concurrency: int = 50  # Number of simultaneous clients.
+    requests: int = 10000  # Total number of requests, unless duration is set.
+    duration: Optional[float] = None  # Seconds to send requests.
+    verb_mix: dict = field(default_factory=lambda: dict(VERB_MIX))  # RequestVerb: weight
+    keys: int = 1000  # Number of different names.
+    distribution: str = 'uniform'  # Names popularity: 'uniform' or 'zipf'.
+    zipf_s: float = 1.1  # Exponent of Zipf distribution.
+    body_min: int = 11  # Min size of phone in WRITE requests.
+    body_max: int = 64  # Max size of phone in WRITE requests.
+    keep_alive: bool = False  # Send requests of client through one connection.
+    timeout: float = 10.0  # Seconds to wait for response.
+    seed: Optional[int] = None  # Seed for repeatable load.
+
+
+@dataclass
+class LoadResult:
+    """Measurements of one load run."""
+
+    latencies: list = field(default_factory=list)  # Seconds of successful requests.
+    statuses: dict = field(default_factory=dict)  # First word of response: count
+    errors: int = 0  # Connection errors and timeouts.
+    elapsed: float = 0.0  # Seconds of the whole run.
+
+
+def make_name(number: int) -> str:
+    """Return user name by its number."""
+    return f'Абонент {number}'
+
+
+class RequestSource:
+    """Random requests by load config.
+
+    Args:
+        config(LoadConfig): Parameters of load.
+
+    """
+
+    def __init__(self, config: LoadConfig):
+        self.config = config
+        self._random = random.Random(config.seed)
+        self._verbs = list(config.verb_mix)
+        self._verb_weights = list(itertools.accumulate(config.verb_mix.values()))
+        if config.distribution == 'zipf':
+            self._key_weights = list(itertools.accumulate(
+                1 / rank ** config.zipf_s for rank in range(1, config.keys + 1)))
+        elif config.distribution == 'uniform':
+            self._key_weights = None
+        else:
+            raise ValueError(f'Unknown key distribution: {config.distribution}')
+
+    def key(self) -> int:
+        """Return number of name, the lower the more popular for Zipf."""
+        if self._key_weights is None:
+            return self._random.randrange(self.config.keys)
+        return bisect_left(self._key_weights, self._random.random() * self._key_weights[-1])
+
+    def phone(self) -> str:
+        """Return phone of random size in body size bounds."""
+        size = self._random.randint(self.config.body_min, self.config.body_max)
+        return ''.join(self._random.choices('0123456789', k=size))
+
+    def request(self) -> bytes:
+        """Return next random request."""
+        verb = self._random.choices(self._verbs, cum_weights=self._verb_weights)[0]
+        return compose_request(verb, make_name(self.key()),
+                             self.phone() if verb == RequestVerb.WRITE else None)
+
+
+async def _read_response(reader: asyncio.StreamReader, keep_alive: bool) -> bytes:
+    if keep_alive:
+        return await reader.readuntil(b'\r\n\r\n')
+    return await reader.read()  # Server closes connection after response.
+
+
+async def _client(addr: str, port: int, source: RequestSource, result: LoadResult,
+                  remaining: Optional[list], deadline: Optional[float]) -> None:
+    config = source.config
+    reader = writer = None
+    while True:
+        if remaining is None:
+            if time.perf_counter() >= deadline:
+                break
+        elif remaining[0] > 0:
+            remaining[0] -= 1  # Requests count is shared by all clients.
+        else:
+            break
+        request = source.request()
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(addr, port), config.timeout)
+            writer.write(request)
+            response = await asyncio.wait_for(
+                _read_response(reader, config.keep_alive), config.timeout)
+            if not response:
+                raise ConnectionResetError('Connection closed without response')
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            result.errors += 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            continue
+        result.latencies.append(time.perf_counter() - started)
+        status = response.split(b' ', 1)[0].decode('UTF-8', 'replace')
+        result.statuses[status] = result.statuses.get(status, 0) + 1
+        if not config.keep_alive or reader.at_eof():
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def generate_load(addr: str, port: int, config: LoadConfig) -> LoadResult:
+    """Send requests to server by config and return measurements.
+
+    Args:
+        addr(str): Server address.
+        port(int): Server port.
+        config(LoadConfig): Parameters of load.
+    Returns:
+        LoadResult: Latencies, response statuses and errors count.
+
+    """
+    source, result = RequestSource(config), LoadResult()
+    started = time.perf_counter()
+    if config.duration is None:
+        remaining, deadline = [config.requests], None
+    else:
+        remaining, deadline = None, started + config.duration
+    await asyncio.gather(*(_client(addr, port, source, result, remaining, deadline)
+                           for _ in range(config.concurrency)))
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+async def prefill(addr: str, port: int, config: LoadConfig) -> None:
+    """Write every name once, so GET requests find data."""
+    source = RequestSource(config)
+    semaphore = asyncio.Semaphore(config.concurrency)
+
+    async def write(number: int) -> None:
+        async with semaphore:
+            reader, writer = await asyncio.open_connection(addr, port)
+            writer.write(compose_request(RequestVerb.WRITE, make_name(number), source.phone()))
+            await _read_response(reader, config.keep_alive)
+            writer.close()
+
+    await asyncio.gather(*(write(number) for number in range(config.keys)))
+
+
+def percentile(sorted_values: list, share: float) -> float:
+    """Return value below which share of sorted values is, nearest rank method."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(share * len(sorted_values)))]
+
+
+def summarize(result: LoadResult) -> dict:
+    """Return throughput and latency percentiles in milliseconds."""
+    latencies = sorted(result.latencies)
+    return {
+        'requests': len(latencies),
+        'errors': result.errors,
+        'elapsed_s': round(result.elapsed, 3),
+        'rps': round(len(latencies) / result.elapsed, 1) if result.elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'p999_ms': round(percentile(latencies, 0.999) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        'statuses': result.statuses,
+    }
+
+
+def parse_verb_mix(text: str) -> dict:
+    """Parse verb mix like 'GET=80,WRITE=15,DELETE=5'."""
+    mix = {}
+    for part in text.split(','):
+        verb, weight = part.split('=')
+        mix[RequestVerb[verb.strip().upper()]] = float(weight)
+    return mix
+
+
+def add_load_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add arguments of LoadConfig to parser."""
+    defaults = LoadConfig()
+    parser.add_argument('--concurrency', type=int, default=defaults.concurrency)
+    parser.add_argument('--requests', type=int, default=defaults.requests)
+    parser.add_argument('--duration', type=float, help='seconds to run instead of --requests')
+    parser.add_argument('--verb-mix', type=parse_verb_mix, default=defaults.verb_mix,
+                        help='weights of verbs, like GET=80,WRITE=15,DELETE=5')
+    parser.add_argument('--keys', type=int, default=defaults.keys, help='number of names')
+    parser.add_argument('--distribution', choices=('uniform', 'zipf'), default=defaults.distribution)
+    parser.add_argument('--zipf-s', type=float, default=defaults.zipf_s)
+    parser.add_argument('--body-min', type=int, default=defaults.body_min)
+    parser.add_argument('--body-max', type=int, default=defaults.body_max)
+    parser.add_argument('--keep-alive', action='store_true', help='port is a keep-alive port')
+    parser.add_argument('--timeout', type=float, default=defaults.timeout)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--prefill', action='store_true', help='write every name before run')
+
+
+def load_config(args: argparse.Namespace) -> LoadConfig:
+    """Make LoadConfig from parsed arguments."""
+    return LoadConfig(
+        concurrency=args.concurrency, requests=args.requests, duration=args.duration,
+        verb_mix=args.verb_mix, keys=args.keys, distribution=args.distribution,
+        zipf_s=args.zipf_s, body_min=args.body_min, body_max=args.body_max,
+        keep_alive=args.keep_alive, timeout=args.timeout, seed=args.seed)
+
+
+async def main(args: argparse.Namespace) -> None:
+    config = load_config(args)
+    if args.prefill:
+        await prefill(args.addr, args.port, config)
+    print(summarize(await generate_load(args.addr, args.port, config)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='RKSOK load generator.')
+    parser.add_argument('addr')
+    parser.add_argument('port', type=int)
+    add_load_arguments(parser)
+    asyncio.run(main(parser.parse_args()))
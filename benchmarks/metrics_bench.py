@@ -0,0 +1,50 @@
+"""Measures time which metrics add to one request, recording on and off.
+
+"off" is what is left with server option --no-metrics: timers and verb
+labels. Share of the event loop thread taken by metrics is time per
+request multiplied by requests per second of the server, take rps from
+benchmarks.runner.
+
+Run: python -m benchmarks.metrics_bench [NUMBER] [RPS]
+"""
+
+import sys
+import time
+import timeit
+
+from metrics import STAGES, Metrics
+from server import verb_label
+
+
+REQUEST = 'ОТДОВАЙ Иван Хмурый РКСОК/1.0\r\n\r\n'.encode()
+PHRASE = 'N_FND'
+
+
+def request_metrics(metrics: Metrics) -> None:
+    """Make the calls of metrics which server makes for one request."""
+    started = time.perf_counter()
+    verb = verb_label(REQUEST)
+    for stage in STAGES[:-2] + STAGES[-1:]:  # 'backend' is of proxy.
+        finished = time.perf_counter()
+        metrics.observe(stage, verb, finished - started)
+        started = finished
+    verb_label(REQUEST)  # Protocol handler labels received and written requests separately.
+    metrics.count_request(verb, PHRASE)
+
+
+def run(number: int, rps: float) -> None:
+    """Print time per request with metrics on and off and share of event loop at rps."""
+    disabled = Metrics()
+    disabled.disable()
+    times = {}
+    for name, metrics in (('on', Metrics()), ('off', disabled)):
+        times[name] = min(timeit.repeat(lambda: request_metrics(metrics),
+                                        number=number, repeat=5)) / number
+        print(f'{name:>4}: {times[name] * 1e6:8.3f} us per request')
+    print(f'metrics: {times["on"] * 1e6:.3f} us per request, '  # Timers exist only for metrics.
+          f'{times["on"] * rps * 100:.2f}% of event loop at {rps:.0f} rps')
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 2000.0)
@@ -0,0 +1,54 @@
+"""Compares str based request parser with bytes based one.
+
+Run: python -m benchmarks.parser_bench [NUMBER]
+"""
+
+import sys
+import timeit
+
+from config import ENCODING, ResponsePhrase
+from parse_data import (forms_response_chunks, forms_response_to_client, parse_client_request,
+                        parse_request)
+
+
+REQUESTS = [
+    'ОТДОВАЙ Иван Хмурый РКСОК/1.0\r\n\r\n',
+    'ЗОПИШИ Иван Хмурый РКСОК/1.0\r\n89012345678 — мобильный\r\n02 — рабочий\r\n\r\n',
+    'УДОЛИ Иван Хмурый РКСОК/1.0\r\n\r\n',
+    'ПРИВЕТ Иван Хмурый РКСОК/1.0\r\n\r\n',
+]
+RAW_REQUESTS = [request.encode(ENCODING) for request in REQUESTS]
+RESPONSES = [ResponsePhrase.N_FND, (ResponsePhrase.OK, '89012345678 — мобильный')]
+
+
+def str_parser() -> None:
+    for raw in RAW_REQUESTS:
+        parse_client_request(raw.decode(ENCODING))
+
+
+def bytes_parser() -> None:
+    for raw in RAW_REQUESTS:
+        parse_request(raw)
+
+
+def str_response() -> None:
+    for response in RESPONSES:
+        forms_response_to_client(response).encode(ENCODING)
+
+
+def bytes_response() -> None:
+    for response in RESPONSES:
+        forms_response_chunks(response)
+
+
+def run(number: int) -> None:
+    """Print time per call of every benchmark pair."""
+    for old, new in ((str_parser, bytes_parser), (str_response, bytes_response)):
+        old_time = min(timeit.repeat(old, number=number, repeat=5)) / number
+        new_time = min(timeit.repeat(new, number=number, repeat=5)) / number
+        print(f'{old.__name__:>14}: {old_time * 1e6:8.3f} us')
+        print(f'{new.__name__:>14}: {new_time * 1e6:8.3f} us  (x{old_time / new_time:.2f})')
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,179 @@
+"""Runs RKSOK server with stub validation server under generated load and saves results.
+
+Server is started from this repository in a temporary directory, so its
+database and logs don't touch the working ones. Results are saved as JSON
+with the current git commit, comparing with a saved result reports
+regression of throughput or latency.
+
+Run: python -m benchmarks.runner [options] [-- SERVER_OPTIONS], see --help.
+Example: python -m benchmarks.runner --distribution zipf --baseline benchmarks/results/old.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional
+
+from benchmarks.load_generator import (add_load_arguments, generate_load, load_config, prefill,
+                                       summarize)
+
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_PATH = os.path.join(REPOSITORY, 'benchmarks', 'results')
+REGRESSION_THRESHOLD = 0.1  # Share of throughput drop or latency growth reported as regression.
+
+
+def free_port() -> int:
+    """Return port which is free at the moment."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, process: subprocess.Popen, timeout: float = 10.0) -> None:
+    """Wait until process listens on port."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{process.args} exited with code {process.returncode}')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f'{process.args} does not listen on port {port}')
+
+
+def git_commit() -> Optional[str]:
+    """Return current commit of repository."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPOSITORY,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def stop(process: subprocess.Popen) -> None:
+    """Stop process by SIGTERM, kill it if it doesn't stop."""
+    process.terminate()
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def run_benchmark(args: argparse.Namespace) -> dict:
+    """Start stub validation server and RKSOK server, generate load and return results."""
+    config = load_config(args)
+    validator_port, server_port = free_port(), free_port()
+    processes = []
+    with tempfile.TemporaryDirectory(prefix='rksok_bench_') as work_dir:
+        try:
+            validator = subprocess.Popen(
+                [sys.executable, '-m', 'benchmarks.stub_validator', str(validator_port),
+                 '--latency', str(args.validator_latency), '--deny-ratio', str(args.deny_ratio)],
+                cwd=REPOSITORY, stdout=subprocess.DEVNULL)
+            processes.append(validator)
+            wait_for_port(validator_port, validator)
+            port_option = ['--keep-alive-port', str(server_port)] if config.keep_alive else []
+            server = subprocess.Popen(
+                [sys.executable, os.path.join(REPOSITORY, 'server.py'), '127.0.0.1',
+                 str(free_port() if config.keep_alive else server_port), *port_option,
+                 '--validation-addr', '127.0.0.1', '--validation-port', str(validator_port),
+                 *args.server_options],
+                cwd=work_dir, stdout=subprocess.DEVNULL)
+            processes.append(server)
+            wait_for_port(server_port, server)
+            if args.prefill:
+                asyncio.run(prefill('127.0.0.1', server_port, config))
+            summary = summarize(asyncio.run(generate_load('127.0.0.1', server_port, config)))
+        finally:
+            for process in reversed(processes):
+                stop(process)
+    return {
+        'commit': git_commit(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'server_options': args.server_options,
+        'load': {
+            **{key: value for key, value in vars(config).items() if key != 'verb_mix'},
+            'verb_mix': {verb.name: weight for verb, weight in config.verb_mix.items()},
+            'prefill': args.prefill,
+            'validator_latency': args.validator_latency,
+            'deny_ratio': args.deny_ratio,
+        },
+        'result': summary,
+    }
+
+
+def compare(result: dict, baseline: dict, threshold: float = REGRESSION_THRESHOLD) -> list:
+    """Return descriptions of regressions of result against baseline."""
+    regressions = []
+    new, old = result['result'], baseline['result']
+    if old['rps'] and new['rps'] < old['rps'] * (1 - threshold):
+        regressions.append(f"rps {old['rps']} -> {new['rps']}")
+    for key in ('p50_ms', 'p99_ms', 'p999_ms'):
+        if old[key] and new[key] > old[key] * (1 + threshold):
+            regressions.append(f'{key} {old[key]} -> {new[key]}')
+    return regressions
+
+
+def save(result: dict, path: Optional[str] = None) -> str:
+    """Save result as JSON, by default to RESULTS_PATH named by time and commit."""
+    if path is None:
+        os.makedirs(RESULTS_PATH, exist_ok=True)
+        name = f"{result['time'].replace(':', '-')}_{result['commit'] or 'unknown'}.json"
+        path = os.path.join(RESULTS_PATH, name)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def parse_args(args: Optional[list] = None) -> argparse.Namespace:
+    """Parse command line arguments, the ones after -- are passed to server."""
+    args = sys.argv[1:] if args is None else args
+    server_options = []
+    if '--' in args:
+        args, server_options = args[:args.index('--')], args[args.index('--') + 1:]
+    parser = argparse.ArgumentParser(description='RKSOK server benchmark.')
+    add_load_arguments(parser)
+    parser.add_argument('--validator-latency', type=float, default=0.0,
+                        help='seconds stub validation server waits before answer')
+    parser.add_argument('--deny-ratio', type=float, default=0.0,
+                        help='share of requests denied by stub validation server')
+    parser.add_argument('--output', help='JSON file for results, default is benchmarks/results/')
+    parser.add_argument('--baseline', help='JSON file of previous results to compare with')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='share of change reported as regression')
+    parsed = parser.parse_args(args)
+    parsed.server_options = server_options
+    return parsed
+
+
+def main() -> int:
+    args = parse_args()
+    result = run_benchmark(args)
+    summary = result['result']
+    print(f"{summary['requests']} requests, {summary['errors']} errors in {summary['elapsed_s']} s: "
+          f"{summary['rps']} rps, p50 {summary['p50_ms']} ms, p99 {summary['p99_ms']} ms, "
+          f"p999 {summary['p999_ms']} ms")
+    print(f"Statuses: {summary['statuses']}")
+    print(f'Saved to {save(result, args.output)}')
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(result, json.load(f), args.threshold)
+        if regressions:
+            print('Regressions: ' + ', '.join(regressions))
+            return 1
+        print('No regressions')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""Local validation server for benchmarks, answers МОЖНА or НИЛЬЗЯ after fixed latency.
+
+Connections are kept open, so it works with pooled connections of the server.
+
+Run: python -m benchmarks.stub_validator PORT [--latency SECONDS] [--deny-ratio RATIO]
+"""
+
+import argparse
+import asyncio
+import random
+from typing import Optional
+
+from config import ENCODING, PROTOCOL, ResponsePhrase
+
+
+APPROVED_RESPONSE = f'{ResponsePhrase.APPR.value} {PROTOCOL}\r\n\r\n'.encode(ENCODING)
+NOT_APPROVED_RESPONSE = f'{ResponsePhrase.N_APPR.value} {PROTOCOL}\r\nБенчмарк\r\n\r\n'.encode(ENCODING)
+
+
+class StubValidator:
+    """Validation server stub.
+
+    Args:
+        latency(float): Seconds to wait before every answer.
+        deny_ratio(float): Share of requests answered НИЛЬЗЯ.
+        seed(Optional[int]): Seed of random verdicts for repeatable runs.
+
+    """
+
+    def __init__(self, latency: float = 0.0, deny_ratio: float = 0.0, seed: Optional[int] = None):
+        self.latency, self.deny_ratio = latency, deny_ratio
+        self.requests, self.denied = 0, 0
+        self._random = random.Random(seed)
+
+    async def handle_connection(self, reader: asyncio.StreamReader,
+                                writer: asyncio.StreamWriter) -> None:
+        """Answer requests from connection until it is closed."""
+        try:
+            while True:
+                await reader.readuntil(b'\r\n\r\n')
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                self.requests += 1
+                if self._random.random() < self.deny_ratio:
+                    self.denied += 1
+                    writer.write(NOT_APPROVED_RESPONSE)
+                else:
+                    writer.write(APPROVED_RESPONSE)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, addr: str, port: int) -> asyncio.AbstractServer:
+        """Start listening on addr and port."""
+        return await asyncio.start_server(self.handle_connection, addr, port)
+
+
+async def serve(addr: str, port: int, latency: float, deny_ratio: float) -> None:
+    """Run stub validation server until cancelled."""
+    server = await StubValidator(latency, deny_ratio).start(addr, port)
+    print(f'Stub validation server on {addr}:{port}', flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def parse_args(args: Optional[list] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Stub RKSOK validation server.')
+    parser.add_argument('port', type=int)
+    parser.add_argument('--addr', default='127.0.0.1')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds before every answer')
+    parser.add_argument('--deny-ratio', type=float, default=0.0, help='share of НИЛЬЗЯ answers')
+    return parser.parse_args(args)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    try:
+        asyncio.run(serve(args.addr, args.port, args.latency, args.deny_ratio))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,293 @@
+"""Offline bulk import and export of users data in CSV or JSONL.
+
+Records go straight to the storage, without validation server and
+without running server. Stop the server before import to the "log"
+backend, the data file can't be shared by processes. Running server
+doesn't see imported users until restart, its cache of users keeps
+NOT FOUND answers, KEY_FILTER doesn't have the keys.
+
+CSV has header "name,phone", JSONL lines are {"name": ..., "phone": ...}.
+Phone lines are separated by "\\n" in files and by "\\r\\n" in storage.
+If a name is repeated in file, its last record is stored: records of one
+name are written by the same worker in file order.
+
+Run:
+    python bulk.py import contacts.csv
+    python bulk.py export contacts.jsonl --format jsonl
+"""
+
+import argparse
+import asyncio
+from base64 import b64decode
+from collections import deque
+import csv
+import json
+import sys
+import time
+from typing import Iterator, Optional, TextIO
+
+from loguru import logger
+
+from config import (BULK_BATCH_SIZE, BULK_PROGRESS_INTERVAL, BULK_WORKERS, ENCODING,
+                    MAX_NAME_LENGTH, STORAGE_BACKEND)
+from parse_data import make_uniq_id
+from storage import STORAGE_BACKENDS, Storage, create_storage
+
+
+FORMATS = ('csv', 'jsonl')
+
+
+class Progress:
+    """Counts processed records and reports rate every interval seconds.
+
+    Args:
+        action(str): What is done with records, for report.
+        interval(float): Seconds between reports.
+
+    """
+
+    def __init__(self, action: str, interval: float = BULK_PROGRESS_INTERVAL):
+        self.action, self.interval = action, interval
+        self.done, self.skipped = 0, 0
+        self.started = self._reported = time.monotonic()
+
+    def add(self, done: int = 0, skipped: int = 0) -> None:
+        self.done += done
+        self.skipped += skipped
+        if time.monotonic() - self._reported >= self.interval:
+            self._reported = time.monotonic()
+            self.report()
+
+    def report(self, final: bool = False) -> None:
+        elapsed = time.monotonic() - self.started
+        logger.info(f'{"Finished: " if final else ""}{self.action} {self.done} records, '
+                    f'skipped {self.skipped}, {self.done / elapsed if elapsed else 0:.0f} records/s')
+
+
+def user_data_from_file(phone: str) -> str:
+    """Convert phone from file to storage format."""
+    return '\r\n'.join(phone.replace('\r\n', '\n').strip('\n').split('\n'))
+
+
+def user_data_to_file(user_data: str) -> str:
+    """Convert stored phone to file format, the same data as get_user() sends."""
+    return user_data.rstrip('\r\n').replace('\r\n', '\n')
+
+
+def check_record(name: str, phone: str) -> Optional[str]:
+    """Return reason why record can't be imported or None if it is correct."""
+    if not name or len(name) > MAX_NAME_LENGTH:
+        return f'name length should be from 1 to {MAX_NAME_LENGTH}'
+    if '\n' in name or '\r' in name:
+        return 'name has line break'
+    if '\n\n' in phone.replace('\r\n', '\n').strip('\n'):
+        return 'phone has empty line, it ends request'
+    return None
+
+
+def read_records(file: TextIO, file_format: str) -> Iterator[tuple]:
+    """Lazily yield (line number, name, phone) from file, phone is None for broken lines."""
+    if file_format == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row.get('name') or '', row.get('phone')
+    else:
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                yield line_number, str(record['name']), str(record['phone'])
+            except (ValueError, KeyError, TypeError):
+                yield line_number, '', None
+
+
+def read_batches(file: TextIO, file_format: str, batch_size: int, progress: Progress,
+                 parts: int = 1) -> Iterator[tuple]:
+    """Lazily yield (part, list of (key, user_data)) of correct records.
+
+    Keys are split to parts by hash, so all records of one key are in one part.
+
+    """
+    batches: list = [[] for _ in range(parts)]
+    for line_number, name, phone in read_records(file, file_format):
+        reason = 'broken line' if phone is None else check_record(name.strip(), phone)
+        if reason is not None:
+            logger.warning(f'Line {line_number} is skipped: {reason}')
+            progress.add(skipped=1)
+            continue
+        key = make_uniq_id(name.strip())
+        part = hash(key) % parts
+        batches[part].append((key, user_data_from_file(phone)))
+        if len(batches[part]) >= batch_size:
+            yield part, batches[part]
+            batches[part] = []
+    for part, batch in enumerate(batches):
+        if batch:
+            yield part, batch
+
+
+async def import_records(storage: Storage, file: TextIO, file_format: str,
+                         batch_size: int = BULK_BATCH_SIZE, workers: int = BULK_WORKERS) -> Progress:
+    """Write records from file to storage.
+
+    File is read by batches, at most 3 * workers batches are in memory.
+    Every worker writes its part of keys, so batches with the same key are
+    written one after another in file order.
+
+    Args:
+        storage(Storage): Opened storage.
+        file(TextIO): File with records.
+        file_format(str): One of FORMATS.
+        batch_size(int): Records written at once.
+        workers(int): Batches written at the same time, each one by its own worker.
+    Returns:
+        Progress: Count of imported and skipped records.
+
+    """
+    progress = Progress('imported')
+    queues = [asyncio.Queue(maxsize=1) for _ in range(workers)]
+    errors = []
+
+    async def write_batches(queue: asyncio.Queue) -> None:
+        while True:
+            batch = await queue.get()
+            if batch is None:
+                return
+            if errors:
+                continue  # Import is stopped, queue is drained to let reader finish.
+            try:
+                await storage.write_many(batch)
+            except Exception as error:
+                errors.append(error)
+                continue
+            progress.add(done=len(batch))
+
+    writers = [asyncio.ensure_future(write_batches(queue)) for queue in queues]
+    try:
+        for part, batch in read_batches(file, file_format, batch_size, progress, workers):
+            if errors:
+                break
+            await queues[part].put(batch)  # Waits while worker is busy, memory stays bounded.
+        for queue in queues:
+            await queue.put(None)
+        await asyncio.gather(*writers)
+    finally:
+        for writer in writers:
+            writer.cancel()
+    if errors:
+        raise errors[0]
+    progress.report(final=True)
+    return progress
+
+
+def record_writer(file: TextIO, file_format: str):
+    """Return function writing (name, phone) record to file."""
+    if file_format == 'csv':
+        writer = csv.writer(file)
+        writer.writerow(('name', 'phone'))
+        return lambda name, phone: writer.writerow((name, phone))
+    return lambda name, phone: file.write(json.dumps({'name': name, 'phone': phone},
+                                                     ensure_ascii=False) + '\n')
+
+
+async def export_records(storage: Storage, file: TextIO, file_format: str,
+                         batch_size: int = BULK_BATCH_SIZE, workers: int = BULK_WORKERS) -> Progress:
+    """Write all records of storage to file.
+
+    Keys are iterated lazily, values are read by batches, at most `workers`
+    batches are read at the same time and written in keys order.
+
+    Args:
+        storage(Storage): Opened storage.
+        file(TextIO): File for records.
+        file_format(str): One of FORMATS.
+        batch_size(int): Records read at once.
+        workers(int): Batches read at the same time.
+    Returns:
+        Progress: Count of exported records.
+
+    """
+    progress = Progress('exported')
+    write_record = record_writer(file, file_format)
+    reads: deque = deque()  # (keys, task reading their values)
+
+    def write_batch(keys: list, values: list) -> None:
+        written, skipped = 0, 0
+        for key, user_data in zip(keys, values):
+            if user_data is None:
+                continue  # Deleted after listing.
+            try:
+                name = b64decode(key, validate=True).decode(ENCODING)
+            except (ValueError, UnicodeDecodeError):
+                logger.warning(f'Key {key!r} is skipped: it is not made by make_uniq_id()')
+                skipped += 1
+                continue
+            write_record(name, user_data_to_file(user_data))
+            written += 1
+        progress.add(done=written, skipped=skipped)
+
+    async def read_batch(keys: list) -> None:
+        if len(reads) >= workers:
+            done_keys, task = reads.popleft()
+            write_batch(done_keys, await task)
+        reads.append((keys, asyncio.ensure_future(storage.read_many(keys))))
+
+    try:
+        keys = []
+        async for key in storage.keys():
+            keys.append(key)
+            if len(keys) >= batch_size:
+                await read_batch(keys)
+                keys = []
+        if keys:
+            await read_batch(keys)
+        while reads:
+            done_keys, task = reads.popleft()
+            write_batch(done_keys, await task)
+    finally:
+        for _, task in reads:
+            task.cancel()
+    progress.report(final=True)
+    return progress
+
+
+async def run(args: argparse.Namespace) -> None:
+    storage = create_storage(args.backend)
+    await storage.open()
+    try:
+        if args.command == 'import':
+            with open(args.file, newline='', encoding=ENCODING) as file:
+                await import_records(storage, file, args.format, args.batch_size, args.workers)
+        elif args.file == '-':
+            await export_records(storage, sys.stdout, args.format, args.batch_size, args.workers)
+        else:
+            with open(args.file, 'w', newline='', encoding=ENCODING) as file:
+                await export_records(storage, file, args.format, args.batch_size, args.workers)
+    finally:
+        await storage.close()
+
+
+def parse_args(args: Optional[list] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Bulk import and export of RKSOK users data.')
+    parser.add_argument('command', choices=('import', 'export'))
+    parser.add_argument('file', help='CSV or JSONL file, "-" exports to stdout')
+    parser.add_argument('--format', choices=FORMATS,
+                        help='file format, by default from file extension')
+    parser.add_argument('--backend', choices=tuple(STORAGE_BACKENDS), default=STORAGE_BACKEND)
+    parser.add_argument('--batch-size', type=int, default=BULK_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=BULK_WORKERS)
+    args = parser.parse_args(args)
+    if args.format is None:
+        args.format = 'jsonl' if args.file.endswith(('.jsonl', '.json')) else 'csv'
+    return args
+
+
+if __name__ == '__main__':
+    logger.remove()
+    logger.add(sys.stderr, level='INFO')
+    try:
+        asyncio.run(run(parse_args()))
+    except KeyboardInterrupt:
+        print('\nKeyboard interrupt: bulk operation is stopped!')
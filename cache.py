@@ -0,0 +1,99 @@
+"""In-process caches shared by the server modules."""
+
+from collections import OrderedDict
+import time
+from typing import Any, Hashable, Optional
+
+
+MISSING = object()  # Returned by cache on a miss, None could be a cached value.
+
+
+class LRUCache:
+    """Least recently used cache bounded by entries count and optionally by size.
+
+    Args:
+        max_entries(int): Max number of entries, the oldest ones are evicted.
+        max_bytes(Optional[int]): Max summary size of entries given to set().
+
+    """
+
+    def __init__(self, max_entries: int, max_bytes: Optional[int] = None):
+        self.max_entries, self.max_bytes = max_entries, max_bytes
+        self._entries: OrderedDict = OrderedDict()  # key: (value, expires_at, size)
+        self.size_bytes = 0
+        self.hits, self.misses, self.evictions = 0, 0, 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, count=False) is not MISSING
+
+    def get(self, key: Hashable, count: bool = True) -> Any:
+        """Return cached value or MISSING if there is no fresh entry.
+
+        Args:
+            key(Hashable): Cache key.
+            count(bool): Count the lookup in hits and misses.
+        Returns:
+            Any: Cached value or MISSING.
+
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            self._drop(key)  # Expired entry.
+            entry = None
+        if entry is None:
+            if count:
+                self.misses += 1
+            return MISSING
+        self._entries.move_to_end(key)
+        if count:
+            self.hits += 1
+        return entry[0]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, size: int = 0) -> None:
+        """Put value into cache.
+
+        Args:
+            key(Hashable): Cache key.
+            value(Any): Value to cache.
+            ttl(Optional[float]): Seconds to keep the entry, forever if None.
+            size(int): Size of the entry in bytes for max_bytes bound.
+
+        """
+        self.pop(key)
+        if self.max_entries <= 0 or (self.max_bytes is not None and size > self.max_bytes):
+            return  # Entry could never fit into the cache.
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._entries[key] = (value, expires_at, size)
+        self.size_bytes += size
+        while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self.size_bytes > self.max_bytes):
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        """Remove entry from cache if it exists."""
+        if key in self._entries:
+            self._drop(key)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        self._entries.clear()
+        self.size_bytes = 0
+
+    def stats(self) -> dict:
+        """Return counters of the cache."""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.size_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+        }
+
+    def _drop(self, key: Hashable) -> None:
+        self.size_bytes -= self._entries.pop(key)[2]
@@ -0,0 +1,134 @@
+"""Circuit breaker which stops calls to a failing dependency and probes it with backoff."""
+
+import asyncio
+from collections import deque
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from loguru import logger
+
+from config import (BREAKER_CALL_TIMEOUT, BREAKER_ERROR_RATE, BREAKER_HALF_OPEN_PROBES,
+                    BREAKER_MAX_OPEN_TIME, BREAKER_MIN_CALLS, BREAKER_OPEN_TIME, BREAKER_WINDOW)
+
+
+T = TypeVar('T')
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Call is rejected by open circuit breaker."""
+
+
+class CircuitBreaker:
+    """Counts failures of calls and rejects calls while dependency is failing.
+
+    Closed breaker lets calls through and opens when share of failures
+    among the last calls reaches error_rate. Open breaker rejects calls
+    for open_time seconds, then becomes half-open and lets through a few
+    probe calls. Successful probe closes breaker, failed one opens it again
+    for twice longer time up to max_open_time.
+
+    Args:
+        name(str): Name of dependency for logs.
+        call_timeout(Optional[float]): Seconds for call, slower call is cancelled and counted
+            as failure, None if function limits its time itself.
+        window(int): Number of last calls to count error rate.
+        min_calls(int): Min number of calls in window to open breaker.
+        error_rate(float): Share of failed calls to open breaker.
+        open_time(float): Seconds before the first probe.
+        max_open_time(float): Max seconds between probes.
+        half_open_probes(int): Max probe calls at once.
+
+    """
+
+    def __init__(self, name: str, call_timeout: Optional[float] = BREAKER_CALL_TIMEOUT,
+                 window: int = BREAKER_WINDOW, min_calls: int = BREAKER_MIN_CALLS,
+                 error_rate: float = BREAKER_ERROR_RATE, open_time: float = BREAKER_OPEN_TIME,
+                 max_open_time: float = BREAKER_MAX_OPEN_TIME,
+                 half_open_probes: int = BREAKER_HALF_OPEN_PROBES):
+        self.name, self.call_timeout = name, call_timeout
+        self.min_calls, self.error_rate = min_calls, error_rate
+        self.open_time, self.max_open_time = open_time, max_open_time
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self._results: deque = deque(maxlen=window)  # True for failed call.
+        self._backoff = open_time
+        self._open_until = 0.0
+        self._probes = 0
+        self.transitions = dict.fromkeys(STATE_CODES, 0)
+        self.calls, self.failures, self.rejected = 0, 0, 0
+
+    def allow(self) -> bool:
+        """Check call could be made now."""
+        if self.state == OPEN and time.monotonic() >= self._open_until:
+            self._set_state(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            return self._probes < self.half_open_probes
+        return self.state == CLOSED
+
+    async def call(self, function: Callable[[], Awaitable[T]]) -> T:
+        """Make call through breaker.
+
+        Raises:
+            CircuitOpenError: If breaker rejects the call.
+            asyncio.TimeoutError: If call is slower than call_timeout.
+
+        """
+        if not self.allow():
+            self.rejected += 1
+            raise CircuitOpenError(f'Circuit breaker of {self.name} is open')
+        probe = self.state == HALF_OPEN
+        if probe:
+            self._probes += 1
+        self.calls += 1
+        try:
+            result = await asyncio.wait_for(function(), self.call_timeout)
+        except (OSError, asyncio.TimeoutError):
+            self.failures += 1
+            self._record(failed=True, probe=probe)
+            raise
+        except BaseException:
+            if probe:
+                self._probes -= 1  # Cancelled probe tells nothing about dependency.
+            raise
+        self._record(failed=False, probe=probe)
+        return result
+
+    def stats(self) -> dict:
+        """Return state code, transitions and calls counters."""
+        return {'state': STATE_CODES[self.state], 'transitions': dict(self.transitions),
+                'calls': self.calls, 'failures': self.failures, 'rejected': self.rejected}
+
+    def _record(self, failed: bool, probe: bool) -> None:
+        if probe:
+            self._probes -= 1
+            if self.state != HALF_OPEN:
+                return  # Another probe already decided.
+            if failed:
+                self._backoff = min(self._backoff * 2, self.max_open_time)
+                self._open()
+            else:
+                self._backoff = self.open_time
+                self._results.clear()
+                self._set_state(CLOSED)
+            return
+        if self.state != CLOSED:
+            return  # Call started before breaker was opened.
+        self._results.append(failed)
+        if (failed and len(self._results) >= self.min_calls
+                and sum(self._results) / len(self._results) >= self.error_rate):
+            self._open()
+
+    def _open(self) -> None:
+        self._open_until = time.monotonic() + self._backoff
+        self._set_state(OPEN)
+
+    def _set_state(self, state: str) -> None:
+        self.transitions[state] += 1
+        if state == OPEN:
+            logger.warning(f'Circuit breaker of {self.name}: {self.state} -> {state}, '
+                           f'next probe in {self._backoff:.1f} s')
+        else:
+            logger.info(f'Circuit breaker of {self.name}: {self.state} -> {state}')
+        self.state = state
@@ -15,9 +15,83 @@ class ResponsePhrase(Enum):
     DNU = "НИПОНЯЛ РКСОК/1.0"
     N_APPR = "НИЛЬЗЯ"
     APPR = "МОЖНА"
+    BUSY = "НИЛЬЗЯ РКСОК/1.0"  # Server refuses request itself, comment tells why.
 
 
 PROTOCOL = "РКСОК/1.0"
 ENCODING = "UTF-8"
+MAX_NAME_LENGTH = 30  # Max length of user name in request.
 VALIDATION_SERVER_URL = "vragi-vezde.to.digital"
 VALIDATION_SERVER_PORT = 51624
+VALIDATION_POOL_SIZE = 10  # Max simultaneously opened connections to validation server.
+VALIDATION_POOL_ACQUIRE_TIMEOUT = 5.0  # Seconds to wait for a free connection from the pool.
+VERDICT_CACHE_SIZE = 10000  # Max number of cached validation server verdicts.
+VERDICT_CACHE_APPR_TTL = 30.0  # Seconds to keep МОЖНА verdicts, 0 disables caching.
+VERDICT_CACHE_N_APPR_TTL = 60.0  # Seconds to keep НИЛЬЗЯ verdicts, 0 disables caching.
+VERDICT_CACHE_STALE_TTL = 3600.0  # Seconds to keep verdicts for "cached_get" degraded policy.
+BREAKER_CALL_TIMEOUT = 2.0  # Seconds for validation server answer, slower one is a failure.
+BREAKER_WINDOW = 20  # Number of last calls to count error rate.
+BREAKER_MIN_CALLS = 10  # Min calls in window to trip the breaker.
+BREAKER_ERROR_RATE = 0.5  # Share of failed calls in window which opens the breaker.
+BREAKER_OPEN_TIME = 1.0  # Seconds before the first probe of open breaker.
+BREAKER_MAX_OPEN_TIME = 60.0  # Max seconds between probes, time is doubled after failed probe.
+BREAKER_HALF_OPEN_PROBES = 1  # Calls let through at once to probe validation server.
+DEGRADED_POLICY = "fail_fast"  # Validation server is down: "fail_fast" - НИЛЬЗЯ, "cached_get" - GET by old verdicts.
+VALIDATOR_DOWN_COMMENT = "Органы проверки недоступны, попробуй позже"  # Comment of НИЛЬЗЯ in degraded mode.
+STORAGE_BACKEND = "files"  # "files" - file per user, "log" - append-only single file.
+DB_PATH = "db"
+LOG_STORAGE_FILE = "rksok.log"
+COMPACTION_MIN_GARBAGE_BYTES = 1024 * 1024  # Dead records size to start log storage compaction.
+COMPACTION_GARBAGE_RATIO = 0.5  # Dead records share of log storage file to start compaction.
+DURABILITY = "none"  # "none" - no fsync, "batched" - one fsync for writes in GROUP_COMMIT_WINDOW, "per-write".
+GROUP_COMMIT_WINDOW = 0.005  # Seconds to collect writes for one fsync in "batched" durability.
+USER_CACHE_SIZE = 10000  # Max number of cached users records, 0 disables cache.
+USER_CACHE_MAX_BYTES = 64 * 1024 * 1024  # Max memory size of cached users records.
+KEY_FILTER = True  # Answer НИНАШОЛ for never written users by Bloom filter, without storage lookups.
+KEY_FILTER_CAPACITY = 1000000  # Min number of keys Bloom filter is sized for.
+KEY_FILTER_ERROR_RATE = 0.01  # Target false positive rate of Bloom filter.
+GET_PREFETCH = False  # Read user for GET request at the same time with validation.
+KEEP_ALIVE_IDLE_TIMEOUT = 5.0  # Seconds to wait next request on persistent connection.
+KEEP_ALIVE_MAX_REQUESTS = 1000  # Max requests processed on one persistent connection.
+PIPELINE_MAX_QUEUED = 16  # Received requests waiting for processing, reading pauses above it.
+WORKER_RESTART_DELAY = 1.0  # Seconds before restart of crashed worker process.
+WORKER_SHUTDOWN_TIMEOUT = 10.0  # Seconds to wait workers stop before killing them.
+CONNECTION_HANDLER = "stream"  # "stream" - StreamReader/StreamWriter, "protocol" - asyncio.BufferedProtocol.
+EVENT_LOOP = "asyncio"  # "asyncio" or "uvloop" if it is installed.
+READ_BUFFER_SIZE = 4096  # Initial size of receive buffer of protocol connection handler.
+PROXY_VIRTUAL_NODES = 100  # Points of every backend on the hash ring of sharding proxy.
+PROXY_REPLICAS = 0  # Next backends on the ring which get copies of WRITE and DELETE.
+PROXY_POOL_SIZE = 4  # Max persistent connections from proxy to every backend.
+PROXY_BACKEND_DOWN_COMMENT = "Хранилище недоступно, попробуй позже"  # Comment of НИЛЬЗЯ when backend is down.
+MAX_CONNECTIONS = 1000  # Max simultaneously served client connections.
+MAX_INFLIGHT_VALIDATIONS = 100  # Max requests waiting for validation server verdict.
+MAX_REQUEST_BYTES = 64 * 1024  # Max size of one client request.
+READ_TIMEOUT = 10.0  # Seconds to receive whole request from client.
+REJECT_LINGER = 0.5  # Seconds rejected connection waits for client to close it after busy response.
+VALIDATION_TIMEOUT = 5.0  # Seconds to get validation server verdict.
+STORAGE_TIMEOUT = 5.0  # Seconds to process request with storage.
+WRITE_TIMEOUT = 10.0  # Seconds to send response to client.
+BUSY_COMMENT = "Сервер перегружен, попробуй позже"  # Comment of response when limits are exceeded.
+LOG_LEVEL = "INFO"  # "DEBUG" logs full requests and responses.
+LOG_PATH = "logs"
+LOG_FILE = "debug.log"
+ACCESS_LOG_FILE = "access.log"  # One line per request, None disables access log.
+LOG_BATCH_SIZE = 256  # Messages collected before writing them to log file.
+LOG_FLUSH_INTERVAL = 1.0  # Max seconds message waits to be written to log file.
+LOG_ROTATION_BYTES = 10 * 1024 * 1024  # Log file is rotated when it is bigger.
+LOG_ROTATION_INTERVAL = 24 * 60 * 60  # Log file is rotated when it is older in seconds.
+LOG_RETENTION = 10  # Number of rotated log files to keep.
+METRICS_ADDR = "127.0.0.1"  # Metrics endpoint is local only.
+METRICS_DUMP_INTERVAL = 10.0  # Seconds between metrics dumps to file.
+METRICS_READ_TIMEOUT = 5.0  # Seconds to receive HTTP request to metrics endpoint.
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1.0, 2.5, 5.0, 10.0)  # Upper bounds of latency histogram buckets in seconds.
+PROFILE_MODE = "sample"  # Profiling by SIGUSR1: "sample" - sampled stacks, "cprofile" - every call.
+PROFILE_DURATION = 10.0  # Seconds of profiling window.
+PROFILE_MAX_DURATION = 300.0  # Max seconds of profiling window requested by /profile.
+PROFILE_SAMPLE_INTERVAL = 0.005  # Seconds between stack samples in "sample" mode.
+PROFILE_LAG_INTERVAL = 0.05  # Seconds between event loop lag measurements during profiling.
+PROFILE_SLOW_CALLBACK = 0.05  # Event loop callbacks running longer are reported.
+BULK_BATCH_SIZE = 500  # Records written to storage at once by bulk tool.
+BULK_WORKERS = 4  # Batches written or read by bulk tool at the same time.
+BULK_PROGRESS_INTERVAL = 5.0  # Seconds between progress reports of bulk tool.
@@ -0,0 +1,161 @@
+"""Bloom filter of stored keys, answers which users were never written without storage lookups."""
+
+import asyncio
+from hashlib import blake2b
+import math
+import time
+from typing import Optional
+
+from loguru import logger
+
+from config import ENCODING, KEY_FILTER_CAPACITY, KEY_FILTER_ERROR_RATE
+
+
+class BloomFilter:
+    """Set of strings without false negatives, could answer True for absent ones.
+
+    Args:
+        capacity(int): Expected number of keys.
+        error_rate(float): False positive rate with capacity keys.
+
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))  # Bits.
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0  # Added keys which set new bits, repeated ones are not counted.
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self._bits)
+
+    def _positions(self, key: str) -> list:
+        digest = blake2b(key.encode(ENCODING), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + number * second) % self.size for number in range(self.hashes)]
+
+    def add(self, key: str) -> None:
+        bits, new = self._bits, False
+        for position in self._positions(key):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                bits[position >> 3] |= 1 << (position & 7)
+                new = True
+        self.count += new
+
+    def __contains__(self, key: str) -> bool:
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def expected_error_rate(self) -> float:
+        """Return false positive rate for the number of added keys."""
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+
+class KeyFilter:
+    """Bloom filter of storage keys, built in background from storage.keys().
+
+    Until the filter is built every key may exist. Written keys are added
+    before the write, also to the filter being built, so there are no false
+    negatives. Deleted keys can't be removed from Bloom filter, their bits
+    stay set, so the filter is rebuilt when new keys make it worse than twice
+    the error rate. Keys written to storage by other processes are not seen,
+    the filter must be disabled when storage is shared.
+
+    Args:
+        storage: Storage with keys() iterator.
+        capacity(int): Min expected number of keys, filter is sized for twice the found number.
+        error_rate(float): Target false positive rate.
+
+    """
+
+    def __init__(self, storage, capacity: int = KEY_FILTER_CAPACITY,
+                 error_rate: float = KEY_FILTER_ERROR_RATE):
+        self.storage, self.capacity, self.error_rate = storage, capacity, error_rate
+        self.enabled = True
+        self._filter: Optional[BloomFilter] = None  # Built filter, None until the first build ends.
+        self._building: Optional[BloomFilter] = None
+        self._task: Optional[asyncio.Task] = None
+        self.builds, self.build_seconds, self.keys = 0, 0.0, 0
+        self.definite_misses, self.false_positives = 0, 0
+
+    def start(self) -> None:
+        """Start building the filter in background."""
+        if self.enabled:
+            self._rebuild()
+
+    async def stop(self) -> None:
+        """Stop building and forget the filter."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = self._filter = self._building = None
+
+    def disable(self) -> None:
+        """Answer that every key may exist, for storage changed by other processes."""
+        self.enabled = False
+        self._filter = self._building = None
+
+    def might_contain(self, key: str) -> bool:
+        """Return False if key was never written, counts such definite misses."""
+        if self._filter is None or key in self._filter:
+            return True
+        self.definite_misses += 1
+        return False
+
+    def add(self, key: str) -> None:
+        """Add key which is going to be written."""
+        if self._filter is not None and self._filter.expected_error_rate() > 2 * self.error_rate:
+            self._rebuild()  # Before adding, so the new filter gets the key too.
+        for bloom in (self._filter, self._building):
+            if bloom is not None:
+                bloom.add(key)
+
+    def missed(self) -> None:
+        """Count key which may exist by filter but is not found in storage."""
+        if self._filter is not None:
+            self.false_positives += 1
+
+    def stats(self) -> dict:
+        """Return build time, size and false positive rates of the filter."""
+        bloom = self._filter
+        absent = self.definite_misses + self.false_positives  # Lookups of absent keys.
+        return {
+            'ready': int(bloom is not None),
+            'builds': self.builds,
+            'build_seconds': round(self.build_seconds, 3),
+            'keys': self.keys,
+            'size_bytes': bloom.size_bytes if bloom else 0,
+            'definite_misses': self.definite_misses,
+            'false_positives': self.false_positives,
+            'expected_fp_rate': round(bloom.expected_error_rate(), 6) if bloom else 0.0,
+            'observed_fp_rate': round(self.false_positives / absent, 6) if absent else 0.0,
+        }
+
+    def _rebuild(self) -> None:
+        if self._task is None or self._task.done():
+            count = self._filter.count if self._filter is not None else 0
+            # Set before the scan starts, so keys added until then are not lost.
+            self._building = BloomFilter(max(self.capacity, 2 * count), self.error_rate)
+            self._task = asyncio.ensure_future(self._build(self._building))
+
+    async def _build(self, bloom: BloomFilter) -> None:
+        started = time.perf_counter()
+        keys = 0
+        try:
+            async for key in self.storage.keys():  # Storage lets event loop work while listing.
+                bloom.add(key)
+                keys += 1
+        except Exception:
+            logger.exception('Key filter build failed, every key is looked up in storage')
+            return
+        finally:
+            self._building = None
+        if not self.enabled:
+            return
+        self._filter, self.keys = bloom, keys
+        self.builds += 1
+        self.build_seconds = time.perf_counter() - started
+        logger.info(f'Key filter of {keys} keys is built in {self.build_seconds:.3f} s, '
+                    f'{bloom.size_bytes} bytes, expected false positive rate '
+                    f'{bloom.expected_error_rate():.4f}')
@@ -0,0 +1,30 @@
+"""Async locks by key, mutations of one user are serialized while other users go in parallel."""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Hashable
+
+
+class KeyLocks:
+    """Locks created on demand and dropped when nobody holds or waits for them."""
+
+    def __init__(self):
+        self._locks: dict = {}  # key: [lock, number of holders and waiters]
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    @asynccontextmanager
+    async def hold(self, key: Hashable) -> AsyncIterator[None]:
+        """Hold lock of key during with block."""
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
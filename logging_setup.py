@@ -0,0 +1,139 @@
+"""Log sinks of the server.
+
+Messages are only collected by the event loop thread, separate thread
+writes them to files in batches, so slow disk doesn't stall requests.
+"""
+
+from datetime import datetime
+import os
+import sys
+import threading
+import time
+
+from loguru import logger
+
+from config import (LOG_LEVEL, LOG_PATH, LOG_FILE, ACCESS_LOG_FILE, LOG_BATCH_SIZE,
+                    LOG_FLUSH_INTERVAL, LOG_ROTATION_BYTES, LOG_ROTATION_INTERVAL, LOG_RETENTION)
+
+
+access_logger = logger.bind(access=True)
+
+
+class BatchedFileSink:
+    """Loguru sink writing messages to file in batches from background thread.
+
+    File is rotated by size or age, rotated files are renamed with time of
+    rotation and only the newest of them are kept.
+
+    Args:
+        path(str): Log file path.
+        batch_size(int): Messages count to write without waiting flush interval.
+        flush_interval(float): Max seconds message waits to be written.
+        rotation_bytes(int): Max size of log file.
+        rotation_interval(float): Max age of log file in seconds.
+        retention(int): Number of rotated files to keep.
+
+    """
+
+    def __init__(self, path: str, batch_size: int = LOG_BATCH_SIZE,
+                 flush_interval: float = LOG_FLUSH_INTERVAL,
+                 rotation_bytes: int = LOG_ROTATION_BYTES,
+                 rotation_interval: float = LOG_ROTATION_INTERVAL, retention: int = LOG_RETENTION):
+        self.path = path
+        self.batch_size, self.flush_interval = batch_size, flush_interval
+        self.rotation_bytes, self.rotation_interval = rotation_bytes, rotation_interval
+        self.retention = retention
+        self._batch: list = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._file = None
+        self._opened_at = 0.0
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+
+    def write(self, message: str) -> None:
+        """Collect message, it is written by background thread."""
+        with self._lock:
+            self._batch.append(message)
+            full = len(self._batch) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def stop(self) -> None:
+        """Write collected messages and close file, called by loguru on handler removal."""
+        self._stopped = True
+        self._wakeup.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._write_batch()
+        self._write_batch()
+        if self._file is not None:
+            self._file.close()
+
+    def _write_batch(self) -> None:
+        with self._lock:
+            batch, self._batch = self._batch, []
+        if not batch:
+            return
+        if self._file is None:
+            self._open()
+        elif (os.fstat(self._file.fileno()).st_size >= self.rotation_bytes
+              or time.time() - self._opened_at >= self.rotation_interval):
+            self._rotate()
+        self._file.write(''.join(batch))
+        self._file.flush()
+
+    def _open(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._opened_at = time.time()
+
+    def _rotate(self) -> None:
+        self._file.close()
+        root, extension = os.path.splitext(self.path)
+        rotated_at = datetime.now().strftime('%Y-%m-%d_%H-%M-%S_%f')
+        os.replace(self.path, f'{root}.{rotated_at}{extension}')
+        directory, prefix = os.path.split(root)
+        rotated = sorted(name for name in os.listdir(directory or '.')
+                         if name.startswith(prefix + '.') and name.endswith(extension)
+                         and name != os.path.basename(self.path))
+        for name in rotated[:-self.retention or None]:
+            os.remove(os.path.join(directory, name))
+        self._open()
+
+
+def _not_access(record: dict) -> bool:
+    return 'access' not in record['extra']
+
+
+def _access(record: dict) -> bool:
+    return 'access' in record['extra']
+
+
+def _log_file_name(file_name: str, suffix: str) -> str:
+    root, extension = os.path.splitext(file_name)
+    return f'{root}{suffix}{extension}'
+
+
+def setup_logging(suffix: str = '', files: bool = True) -> None:
+    """Replace default loguru handler with server sinks.
+
+    Args:
+        suffix(str): Added to log file names, separates files of worker processes.
+        files(bool): Write logs to files, else only to stderr.
+
+    """
+    logger.remove()
+    logger.add(sys.stderr, level=LOG_LEVEL, filter=_not_access)
+    if not files:
+        return
+    logger.add(BatchedFileSink(os.path.join(LOG_PATH, _log_file_name(LOG_FILE, suffix))),
+               level=LOG_LEVEL, format="{time} {level} {message}", filter=_not_access)
+    if ACCESS_LOG_FILE:
+        logger.add(BatchedFileSink(os.path.join(LOG_PATH, _log_file_name(ACCESS_LOG_FILE, suffix))),
+                   level='INFO', format="{time} {message}", filter=_access)
@@ -0,0 +1,152 @@
+"""Latency histograms, counters and gauges of the server in Prometheus text format."""
+
+import asyncio
+from bisect import bisect_left
+from collections import defaultdict
+import os
+from typing import Callable, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from loguru import logger
+
+from config import LATENCY_BUCKETS, METRICS_DUMP_INTERVAL, METRICS_READ_TIMEOUT
+
+
+STAGES = ('receive', 'parse', 'validate', 'storage', 'backend', 'write')  # 'backend' is of proxy.
+
+
+class Histogram:
+    """Latency histogram with fixed buckets.
+
+    Args:
+        buckets(tuple): Sorted upper bounds of buckets in seconds.
+
+    """
+
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last one is +Inf bucket.
+        self.total, self.count = 0.0, 0
+
+    def observe(self, seconds: float) -> None:
+        """Add one measurement."""
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def render(self, name: str, labels: str) -> list:
+        """Return Prometheus text lines of histogram."""
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f'{name}_sum{{{labels}}} {self.total}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+class Metrics:
+    """Collects per stage latency and per verb and response phrase counters.
+
+    Gauges are read at render time from collectors registered by other modules.
+
+    """
+
+    def __init__(self):
+        self.latency: defaultdict = defaultdict(Histogram)  # (stage, verb): Histogram
+        self.requests: defaultdict = defaultdict(int)  # (verb, phrase): count
+        self._collectors: dict[str, Callable[[], dict]] = {}
+
+    def observe(self, stage: str, verb: str, seconds: float) -> None:
+        """Add stage latency of request with verb."""
+        self.latency[(stage, verb)].observe(seconds)
+
+    def count_request(self, verb: str, phrase: str) -> None:
+        """Count processed request by verb and response phrase."""
+        self.requests[(verb, phrase)] += 1
+
+    def disable(self) -> None:
+        """Stop recording latency and requests, to measure overhead of metrics."""
+        self.observe = self.count_request = lambda *args: None
+
+    def register_collector(self, name: str, collector: Callable[[], dict]) -> None:
+        """Register function returning dict of gauges, nested dicts become labels."""
+        self._collectors[name] = collector
+
+    def render(self) -> str:
+        """Return all metrics in Prometheus text format."""
+        lines = ['# TYPE rksok_stage_duration_seconds histogram']
+        for (stage, verb), histogram in sorted(self.latency.items()):
+            lines.extend(histogram.render(
+                'rksok_stage_duration_seconds', f'stage="{stage}",verb="{verb}"'))
+        lines.append('# TYPE rksok_requests_total counter')
+        for (verb, phrase), count in sorted(self.requests.items()):
+            lines.append(f'rksok_requests_total{{verb="{verb}",phrase="{phrase}"}} {count}')
+        for collector_name, collector in self._collectors.items():
+            for key, value in collector().items():
+                name = f'rksok_{collector_name}_{key}'
+                if isinstance(value, dict):
+                    lines.extend(f'{name}{{kind="{kind}"}} {number}'
+                                 for kind, number in value.items())
+                elif isinstance(value, (int, float)):
+                    lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+admin_handlers: dict[str, Callable[[dict], str]] = {}  # HTTP path: function of query parameters.
+
+
+def _admin_response(request: bytes) -> Optional[str]:
+    """Return text of admin handler for request path or None for metrics page."""
+    parts = request.split(b'\r\n', 1)[0].decode('latin-1').split(' ')
+    if len(parts) < 2:
+        return None
+    url = urlsplit(parts[1])
+    handler = admin_handlers.get(url.path)
+    if handler is None:
+        return None
+    return handler({key: value[-1] for key, value in parse_qs(url.query).items()})
+
+
+async def process_metrics_request(reader, writer):
+    """Answer HTTP request by admin handler of its path or with metrics page."""
+    try:
+        request = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), METRICS_READ_TIMEOUT)
+        text = _admin_response(request)
+        body = (metrics.render() if text is None else text + '\n').encode()
+        writer.write(b'HTTP/1.1 200 OK\r\n'
+                     b'Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+                     b'Content-Length: %d\r\nConnection: close\r\n\r\n' % len(body) + body)
+        await writer.drain()
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+            ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+def _write_file(path: str, text: str) -> None:
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(path + '.tmp', path)  # Readers never see half written file.
+
+
+async def dump_metrics(path: str, interval: float = METRICS_DUMP_INTERVAL) -> None:
+    """Write metrics to file every interval seconds and once more when cancelled."""
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await loop.run_in_executor(None, _write_file, path, metrics.render())
+            except OSError:
+                logger.exception(f'Can not dump metrics to {path}')
+    finally:
+        try:
+            _write_file(path, metrics.render())  # Final values on shutdown.
+        except OSError:
+            logger.exception(f'Can not dump metrics to {path}')
@@ -4,7 +4,7 @@ from base64 import b64encode
 
 from typing import Optional, Union
 
-from config import PROTOCOL, ENCODING, RequestVerb, ResponsePhrase
+from config import PROTOCOL, ENCODING, MAX_NAME_LENGTH, RequestVerb, ResponsePhrase
 
 
 def make_uniq_id(user_name: str) -> str:
@@ -46,7 +46,7 @@ def parse_client_request(message: str) -> Optional[tuple]:
     """
     if not ' ' in message:
         return None  # Not any spacebars at message.
-    if len(message.split('\r\n', 1)[0].rsplit(' ', 1)[0].split(' ', 1)[1]) > 30:
+    if len(message.split('\r\n', 1)[0].rsplit(' ', 1)[0].split(' ', 1)[1]) > MAX_NAME_LENGTH:
         return None  # Length of request > 30.
     if message.split('\r\n', 1)[0].rsplit(' ', 1)[1] != PROTOCOL:
         return None  # Not correct protocol.
@@ -75,3 +75,106 @@ def forms_response_to_client(response: Union[ResponsePhrase, tuple]) -> str:
         phrase, user_data = response
         return f'{phrase.value}\r\n{user_data}\r\n\r\n'
     return f'{response.value}\r\n\r\n'
+
+
+VERBS = tuple((verb, verb.value.encode(ENCODING)) for verb in RequestVerb)
+PROTOCOL_SUFFIX = f' {PROTOCOL}'.encode(ENCODING)
+MAX_FIRST_LINE_BYTES = (max(len(verb_bytes) for _, verb_bytes in VERBS) + MAX_NAME_LENGTH * 4
+                        + len(PROTOCOL_SUFFIX))  # UTF-8 symbol takes up to 4 bytes.
+RESPONSE_HEADERS = {phrase: f'{phrase.value}\r\n'.encode(ENCODING) for phrase in ResponsePhrase}
+RESPONSES = {phrase: f'{phrase.value}\r\n\r\n'.encode(ENCODING) for phrase in ResponsePhrase}
+RESPONSE_END = b'\r\n\r\n'
+
+
+class RKSOKRequest:
+    """Parsed client request.
+
+    Attributes:
+        verb(RequestVerb): Request verb.
+        name(str): User name.
+        encoded_name(str): Unique id of user made by make_uniq_id().
+        body(str): Request data between the first line and the end of request.
+        raw(bytes): Request as it was received.
+
+    """
+
+    __slots__ = ('verb', 'name', 'encoded_name', 'body', 'raw')
+
+    def __init__(self, verb: RequestVerb, name: str, encoded_name: str, body: str, raw: bytes):
+        self.verb, self.name, self.encoded_name = verb, name, encoded_name
+        self.body, self.raw = body, raw
+
+
+def parse_first_line(raw: bytes) -> Optional[tuple]:
+    """Parse only the first line of raw client request, the same rules as parse_client_request().
+
+    Args:
+        raw(bytes): Request received from a client.
+    Returns:
+        Optional[tuple]: RequestVerb, user name and offset of the first line end
+        or None if request is not correct.
+
+    """
+    line_end = raw.find(b'\r\n', 0, MAX_FIRST_LINE_BYTES + 2)
+    if line_end < 0:
+        return None  # No end of the first line or it is too long.
+    if not raw.endswith(PROTOCOL_SUFFIX, 0, line_end):
+        return None  # Not correct protocol.
+    for verb, verb_bytes in VERBS:
+        if raw.startswith(verb_bytes):
+            break
+    else:
+        return None  # Not found correct request verb.
+    name_end = line_end - len(PROTOCOL_SUFFIX)
+    if name_end < len(verb_bytes):
+        return None  # No name between verb and protocol.
+    try:
+        name = raw[len(verb_bytes):name_end].decode(ENCODING)
+    except UnicodeDecodeError:
+        return None
+    if len(name) > MAX_NAME_LENGTH:
+        return None
+    return verb, name, line_end
+
+
+def parse_request(data: Union[bytes, memoryview]) -> Optional[RKSOKRequest]:
+    """Parse raw client request in one pass, the same rules as parse_client_request().
+
+    Only user name and request body are decoded. Unlike parse_client_request()
+    body doesn't include line breaks which end the request.
+
+    Args:
+        data(Union[bytes, memoryview]): Request received from a client.
+    Returns:
+        Optional[RKSOKRequest]: Parsed request or None if request is not correct.
+
+    """
+    raw = data if isinstance(data, bytes) else bytes(data)
+    first_line = parse_first_line(raw)
+    if first_line is None:
+        return None
+    verb, name, line_end = first_line
+    try:
+        body = raw[line_end + 2:].rstrip(b'\r\n').decode(ENCODING)
+    except UnicodeDecodeError:
+        return None
+    return RKSOKRequest(verb, name, make_uniq_id(name), body, raw)
+
+
+def forms_response_chunks(response: Union[ResponsePhrase, tuple]) -> list:
+    """Forms response to client as list of bytes for writer.writelines().
+
+    Args:
+        response(Union[ResponsePhrase, tuple]): ResponsePhrase with user data or
+        only ResponsePhrase for forming response to client.
+    Returns:
+        (list): Encoded parts of response by RKSOK protocol.
+
+    """
+    if type(response) is tuple:
+        phrase, user_data = response
+        user_data = user_data.rstrip('\r\n')  # Records could be saved with the end of request.
+        if user_data:
+            return [RESPONSE_HEADERS[phrase], user_data.encode(ENCODING), RESPONSE_END]
+        response = phrase
+    return [RESPONSES[response]]
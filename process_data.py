@@ -1,14 +1,63 @@
 """Process data from requests."""
 
-from typing import Union
+import asyncio
+import sys
+from typing import Optional, Union
 
-import aiofiles
-from aiofiles.os import remove
 from loguru import logger
 
-from config import ResponsePhrase
+from cache import LRUCache, MISSING
+from config import KEY_FILTER, ResponsePhrase, STORAGE_BACKEND, USER_CACHE_SIZE, USER_CACHE_MAX_BYTES
+from key_filter import KeyFilter
+from locks import KeyLocks
+from storage import create_storage
 
 
+storage = create_storage(STORAGE_BACKEND)
+user_cache = LRUCache(USER_CACHE_SIZE, USER_CACHE_MAX_BYTES)  # None value is a known miss.
+user_locks = KeyLocks()  # Writes and deletes of one user are made one by one.
+key_filter = KeyFilter(storage)  # Never written users are answered without storage lookups.
+key_filter.enabled = KEY_FILTER and not storage.CHEAP_MISSES
+_mutations = 0  # Count of writes and deletes, read result is cached only if it didn't change.
+
+
+def _cache_user(encoded_name: str, user_data: Optional[str]) -> None:
+    size = sys.getsizeof(encoded_name) + (sys.getsizeof(user_data) if user_data is not None else 0)
+    user_cache.set(encoded_name, user_data, size=size)
+
+
+def use_shared_storage() -> None:
+    """Prepare to serve the same storage from several processes.
+
+    Users cache and key filter are turned off, records could be changed by other processes.
+
+    Raises:
+        ValueError: If storage backend can't be shared between processes.
+
+    """
+    if not storage.MULTIPROCESS_SAFE:
+        raise ValueError(f'Storage backend "{STORAGE_BACKEND}" can not be used by several processes')
+    user_cache.max_entries = 0
+    user_cache.clear()
+    key_filter.disable()
+
+
+async def open_storage() -> None:
+    """Open storage and start building key filter in background."""
+    await storage.open()
+    key_filter.start()
+
+
+async def close_storage() -> None:
+    """Stop key filter and close storage."""
+    await key_filter.stop()
+    await storage.close()
+
+
+def user_cache_stats() -> dict:
+    """Return hit ratio and memory use of users cache."""
+    return user_cache.stats()
+
 
 async def get_user(name: str, encoded_name:str) -> Union[ResponsePhrase, tuple]:
     """Search user into database.
@@ -20,20 +69,57 @@ async def get_user(name: str, encoded_name:str) -> Union[ResponsePhrase, tuple]:
         Union[ResponsePhrase, tuple]: OK phrase and user_data from file.
         
     """
-    logger.debug(f'\nGET_USER_FROM_DB:\nNAME:{name}\nENCODED_NAME:{encoded_name}\n')
-    try:
-        async with aiofiles.open(f"db/{encoded_name}", 'r', encoding='utf-8') as f:
-            user_data = await f.read()
-        logger.debug(f'\nGET_USER_RESPONSE_FULL_DATA:\n{ResponsePhrase.OK.value}\n{user_data}')
-        return (ResponsePhrase.OK, user_data)
-
-    except (FileExistsError, FileNotFoundError):
+    logger.debug('\nGET_USER_FROM_DB:\nNAME:{}\nENCODED_NAME:{}\n', name, encoded_name)
+    user_data = user_cache.get(encoded_name)
+    if user_data is MISSING:
+        if not key_filter.might_contain(encoded_name):
+            return ResponsePhrase.N_FND
+        mutations = _mutations
+        user_data = await storage.read(encoded_name)
+        if mutations == _mutations:  # Record could be changed during reading.
+            _cache_user(encoded_name, user_data)
+        if user_data is None:
+            key_filter.missed()
+    if user_data is None:
         return ResponsePhrase.N_FND
+    logger.debug('\nGET_USER_RESPONSE_FULL_DATA:\n{}\n{}', ResponsePhrase.OK.value, user_data)
+    return (ResponsePhrase.OK, user_data)
+
+
+async def _write_locked(encoded_name: str, request_body: str) -> None:
+    global _mutations
+    async with user_locks.hold(encoded_name):
+        key_filter.add(encoded_name)  # Before the write, so readers can't miss the new record.
+        try:
+            await storage.write(encoded_name, request_body)
+        finally:
+            _mutations += 1
+            user_cache.pop(encoded_name)
+        _cache_user(encoded_name, request_body)
+
+
+async def _delete_locked(encoded_name: str) -> bool:
+    global _mutations
+    async with user_locks.hold(encoded_name):
+        if not key_filter.might_contain(encoded_name):
+            return False
+        try:
+            deleted = await storage.delete(encoded_name)
+        finally:
+            _mutations += 1
+            user_cache.pop(encoded_name)
+        _cache_user(encoded_name, None)
+        if not deleted:
+            key_filter.missed()
+    return deleted
 
 
 async def write_new_user(request_body: str, name: str, encoded_name: str) -> ResponsePhrase:
     """Write new userfile.
 
+    Started write is finished even if request is cancelled by timeout, so
+    the next mutation of the user waits for it and can't be reordered.
+
     Args:
         request_body(str): Body data from client response.
         name(str): Name from client request.
@@ -42,17 +128,10 @@ async def write_new_user(request_body: str, name: str, encoded_name: str) -> Res
         ResponsePhrase: OK phrase.
 
     """
-    logger.debug(f'\nWRITING_NEW_USER_NAME\nNAME:{name}\nENCODED_NAME:{encoded_name}\n')
-    logger.debug(f'\nWRITING_NEW_USER_BODY:\n{request_body}')
-    try:
-        async with aiofiles.open(f"db/{encoded_name}", 'x', encoding='utf-8') as f:
-            await f.write(request_body)
-        return ResponsePhrase.OK
-
-    except FileExistsError:  # If user already exist, rewrite message.
-        async with aiofiles.open(f"db/{encoded_name}", 'w', encoding='utf-8') as f:
-            await f.write(request_body)
-        return ResponsePhrase.OK
+    logger.debug('\nWRITING_NEW_USER_NAME\nNAME:{}\nENCODED_NAME:{}\n', name, encoded_name)
+    logger.debug('\nWRITING_NEW_USER_BODY:\n{}', request_body)
+    await asyncio.shield(_write_locked(encoded_name, request_body))
+    return ResponsePhrase.OK
 
 
 async def delete_user(name: str, encoded_name:str) -> ResponsePhrase:
@@ -65,10 +144,7 @@ async def delete_user(name: str, encoded_name:str) -> ResponsePhrase:
         ResponsePhrase: OK or Not Found phrase.
 
     """
-    logger.debug(f'\nDELETING_USER_NAME_ENCODED_NAME:\n{name}\n{encoded_name}')
-    try:
-        await remove(f"db/{encoded_name}")
+    logger.debug('\nDELETING_USER_NAME_ENCODED_NAME:\n{}\n{}', name, encoded_name)
+    if await asyncio.shield(_delete_locked(encoded_name)):
         return ResponsePhrase.OK
-
-    except (FileExistsError, FileNotFoundError):
-        return ResponsePhrase.N_FND
+    return ResponsePhrase.N_FND
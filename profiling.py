@@ -0,0 +1,202 @@
+"""On-demand profiling of the running server for a fixed window.
+
+Started by SIGUSR1 or by /profile of the local metrics endpoint. Nothing is
+measured between windows. During the window:
+    - "sample" mode: stacks of the event loop thread are sampled from another
+      thread every PROFILE_SAMPLE_INTERVAL seconds, saved as folded stacks for
+      flame graph tools, "cprofile" mode: every call is profiled by cProfile,
+      saved as pstats file;
+    - event loop lag and pending tasks are measured every PROFILE_LAG_INTERVAL seconds;
+    - callbacks running longer than PROFILE_SLOW_CALLBACK seconds are recorded,
+      asyncio.Handle._run is wrapped only for the window, doesn't work with uvloop.
+Files and text report are written to LOG_PATH as profile.{pid}.{time}.*
+"""
+
+import asyncio
+from collections import Counter
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from typing import Optional
+
+from loguru import logger
+
+from config import (LOG_PATH, PROFILE_DURATION, PROFILE_LAG_INTERVAL, PROFILE_MAX_DURATION,
+                    PROFILE_MODE, PROFILE_SAMPLE_INTERVAL, PROFILE_SLOW_CALLBACK)
+
+
+PROFILE_MODES = ('sample', 'cprofile')
+REPORT_TOP = 30  # Lines of top functions and slow callbacks in report.
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+def _callback_label(handle: asyncio.Handle) -> str:
+    """Return coroutine name for task steps, callback repr for other handles."""
+    callback = handle._callback
+    task = getattr(callback, '__self__', None)
+    if isinstance(task, asyncio.Task):
+        coro = task.get_coro()
+        return f'Task {getattr(coro, "__qualname__", coro)}'
+    return repr(handle)
+
+
+class _Sampler(threading.Thread):
+    """Counts stacks of a thread sampled every interval seconds."""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id, self.interval = thread_id, interval
+        self.stacks: Counter = Counter()  # Folded stack: samples
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+class Profiler:
+    """Runs one profiling window at a time and writes its report.
+
+    Args:
+        path(str): Directory for profile files.
+
+    """
+
+    def __init__(self, path: str = LOG_PATH):
+        self.path = path
+        self._task: Optional[asyncio.Task] = None
+        self._slow_callbacks: list = []  # (seconds, callback label)
+        self.last_report: Optional[str] = None
+
+    def start(self, duration: float = PROFILE_DURATION, mode: str = PROFILE_MODE) -> str:
+        """Start profiling window, return message about it."""
+        if mode not in PROFILE_MODES:
+            return f'Unknown profile mode {mode!r}, expected one of {PROFILE_MODES}'
+        if self._task is not None and not self._task.done():
+            return 'Profiling is already running'
+        duration = min(max(duration, 0.1), PROFILE_MAX_DURATION)
+        name = os.path.join(self.path, f'profile.{os.getpid()}.{time.strftime("%Y%m%d-%H%M%S")}')
+        self._task = asyncio.ensure_future(self._run(duration, mode, name))
+        message = f'Profiling in {mode} mode for {duration} s, report {name}.txt'
+        logger.info(message)
+        return message
+
+    def handle_admin_request(self, query: dict) -> str:
+        """Start profiling by query parameters of /profile request."""
+        try:
+            duration = float(query.get('seconds', PROFILE_DURATION))
+        except ValueError:
+            return 'seconds should be a number'
+        return self.start(duration, query.get('mode', PROFILE_MODE)) + (
+            f'\nPending tasks: {len(asyncio.all_tasks())}'
+            f'\nLast report: {self.last_report or "-"}')
+
+    async def stop(self) -> None:
+        """Stop running window, its report is written."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _run(self, duration: float, mode: str, name: str) -> None:
+        loop = asyncio.get_running_loop()
+        lags, tasks = [], []
+        self._slow_callbacks = []
+        original_run = asyncio.Handle._run
+        asyncio.Handle._run = self._timed_run(original_run)
+        sampler = profile = None
+        if mode == 'sample':
+            sampler = _Sampler(threading.get_ident(), PROFILE_SAMPLE_INTERVAL)
+            sampler.start()
+        else:
+            profile = cProfile.Profile()
+            profile.enable()  # Profiles event loop thread, so all coroutines.
+        started = time.perf_counter()
+        try:
+            deadline = loop.time() + duration
+            while loop.time() < deadline:
+                expected = loop.time() + PROFILE_LAG_INTERVAL
+                await asyncio.sleep(PROFILE_LAG_INTERVAL)
+                lags.append(max(0.0, loop.time() - expected))
+                tasks.append(len(asyncio.all_tasks()))
+        finally:
+            if profile is not None:
+                profile.disable()
+            if sampler is not None:
+                sampler.stop()
+            asyncio.Handle._run = original_run
+            elapsed = time.perf_counter() - started
+            try:
+                os.makedirs(self.path, exist_ok=True)
+                report = self._report(mode, elapsed, lags, tasks, sampler, profile, name)
+                with open(name + '.txt', 'w', encoding='utf-8') as f:
+                    f.write(report)
+                self.last_report = name + '.txt'
+                logger.info(f'Profile report is written to {name}.txt')
+            except OSError:
+                logger.exception(f'Can not write profile {name}')
+
+    def _timed_run(self, original_run):
+        slow_callbacks, threshold = self._slow_callbacks, PROFILE_SLOW_CALLBACK
+
+        def timed_run(handle: asyncio.Handle) -> None:
+            started = time.perf_counter()
+            original_run(handle)
+            elapsed = time.perf_counter() - started
+            if elapsed >= threshold:
+                slow_callbacks.append((elapsed, _callback_label(handle)))
+
+        return timed_run
+
+    def _report(self, mode: str, elapsed: float, lags: list, tasks: list,
+                sampler: Optional[_Sampler], profile: Optional[cProfile.Profile], name: str) -> str:
+        """Write profile file and return text report."""
+        lines = [f'Profile of pid {os.getpid()}, mode {mode}, {elapsed:.3f} s']
+        if lags:
+            lags.sort()
+            lines.append(f'Event loop lag: {len(lags)} samples, '
+                         f'avg {sum(lags) / len(lags) * 1000:.3f} ms, '
+                         f'p99 {lags[min(len(lags) - 1, int(0.99 * len(lags)))] * 1000:.3f} ms, '
+                         f'max {lags[-1] * 1000:.3f} ms')
+            lines.append(f'Pending tasks: avg {sum(tasks) / len(tasks):.1f}, max {max(tasks)}')
+        slow = sorted(self._slow_callbacks, reverse=True)
+        lines.append(f'Slow callbacks over {PROFILE_SLOW_CALLBACK * 1000:.0f} ms: {len(slow)}')
+        lines.extend(f'  {seconds * 1000:9.3f} ms  {label}' for seconds, label in slow[:REPORT_TOP])
+        lines.append('')
+        if sampler is not None:
+            with open(name + '.folded', 'w', encoding='utf-8') as f:
+                f.writelines(f'{stack} {count}\n' for stack, count in sampler.stacks.items())
+            total = sum(sampler.stacks.values())
+            own: Counter = Counter()
+            for stack, count in sampler.stacks.items():
+                own[stack.rsplit(';', 1)[-1]] += count
+            lines.append(f'Samples: {total}, folded stacks: {name}.folded')
+            lines.append('Top functions by own samples:')
+            lines.extend(f'  {count / total * 100:6.2f}%  {label}'
+                         for label, count in own.most_common(REPORT_TOP))
+        elif profile is not None:
+            profile.dump_stats(name + '.prof')
+            stream = io.StringIO()
+            pstats.Stats(profile, stream=stream).sort_stats('cumulative').print_stats(REPORT_TOP)
+            lines.append(f'pstats file: {name}.prof')
+            lines.append(stream.getvalue())
+        return '\n'.join(lines) + '\n'
+
+
+profiler = Profiler()
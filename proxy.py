@@ -0,0 +1,186 @@
+"""Sharding proxy: routes RKSOK requests to backend servers by consistent hash of user name.
+
+Proxy parses only the first line of request and forwards raw request to
+the backend owning make_uniq_id(name) on the hash ring. Backends are RKSOK
+servers with their own databases, proxy connects to their keep-alive ports.
+Every backend has PROXY_VIRTUAL_NODES points on the ring, so adding one
+backend moves only about 1/N of keys, see rebalance.py.
+
+With replicas WRITE and DELETE approved by the owner are repeated on the
+next backends of the ring, GET goes to them if the owner is down.
+"""
+
+import asyncio
+from bisect import bisect
+from hashlib import md5
+import time
+from typing import Iterable, Optional
+
+from loguru import logger
+
+from config import (ENCODING, MAX_REQUEST_BYTES, PROXY_BACKEND_DOWN_COMMENT, PROXY_POOL_SIZE,
+                    PROXY_REPLICAS, PROXY_VIRTUAL_NODES, STORAGE_TIMEOUT, VALIDATION_TIMEOUT,
+                    RequestVerb, ResponsePhrase)
+from metrics import metrics
+from parse_data import forms_response_chunks, make_uniq_id, parse_first_line
+from rksok_async_client import RETRIED_VERBS, AsyncRKSOKClient
+
+
+BACKEND_DOWN_RESPONSE = forms_response_chunks((ResponsePhrase.BUSY, PROXY_BACKEND_DOWN_COMMENT))
+OK_HEADER = f'{ResponsePhrase.OK.value}\r\n'.encode(ENCODING)
+REPLICATED_HEADERS = (OK_HEADER, f'{ResponsePhrase.N_FND.value}\r\n'.encode(ENCODING))
+# Backend responses by the first line, НИЛЬЗЯ of validation server and of busy backend are the same.
+RESPONSE_LABELS = {phrase.value.encode(ENCODING): phrase.name for phrase in
+                   (ResponsePhrase.OK, ResponsePhrase.N_FND, ResponsePhrase.DNU, ResponsePhrase.BUSY)}
+REQUEST_END = b'\r\n\r\n'
+RETRIED_NAMES = {verb.name for verb in RETRIED_VERBS}  # Verbs of client and server are different enums.
+
+
+def _hash(value: str) -> int:
+    """Return position on the ring, the same in every process unlike hash()."""
+    return int.from_bytes(md5(value.encode(ENCODING)).digest()[:8], 'big')
+
+
+def parse_node(node: str) -> tuple:
+    """Parse backend 'host:port' to (host, port)."""
+    host, _, port = node.rpartition(':')
+    if not host or not port.isdigit():
+        raise ValueError(f'Backend should be host:port, got {node!r}')
+    return host, int(port)
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes.
+
+    Args:
+        nodes(Iterable[str]): Names of nodes, 'host:port' of backends.
+        vnodes(int): Points of every node on the ring.
+
+    """
+
+    def __init__(self, nodes: Iterable[str], vnodes: int = PROXY_VIRTUAL_NODES):
+        self.nodes = list(dict.fromkeys(nodes))
+        if not self.nodes:
+            raise ValueError('Hash ring needs at least one node')
+        points = sorted((_hash(f'{node}#{number}'), node)
+                        for node in self.nodes for number in range(vnodes))
+        self._hashes = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def node_for(self, key: str) -> str:
+        """Return node owning key."""
+        return self._owners[bisect(self._hashes, _hash(key)) % len(self._owners)]
+
+    def nodes_for(self, key: str, count: int) -> list:
+        """Return owner of key and the next distinct nodes clockwise, count in total."""
+        count = min(count, len(self.nodes))
+        start = bisect(self._hashes, _hash(key))
+        nodes = []
+        for index in range(start, start + len(self._owners)):
+            node = self._owners[index % len(self._owners)]
+            if node not in nodes:
+                nodes.append(node)
+                if len(nodes) == count:
+                    break
+        return nodes
+
+
+class ShardingProxy:
+    """Forwards requests to backends by hash ring.
+
+    Args:
+        backends(list): Backends 'host:port' of keep-alive ports.
+        replicas(int): Backends which get copies of WRITE and DELETE besides the owner.
+        vnodes(int): Points of every backend on the hash ring.
+        pool_size(int): Max persistent connections to every backend.
+
+    """
+
+    def __init__(self, backends: list, replicas: int = PROXY_REPLICAS,
+                 vnodes: int = PROXY_VIRTUAL_NODES, pool_size: int = PROXY_POOL_SIZE):
+        self.ring = HashRing(backends, vnodes)
+        self.replicas = min(replicas, len(self.ring.nodes) - 1)
+        self.clients = {node: AsyncRKSOKClient(*parse_node(node), pool_size=pool_size,
+                                               timeout=VALIDATION_TIMEOUT + STORAGE_TIMEOUT)
+                        for node in self.ring.nodes}
+        self.forwarded = dict.fromkeys(self.ring.nodes, 0)
+        self.failures = dict.fromkeys(self.ring.nodes, 0)
+        self.failovers, self.replication_failures = 0, 0
+
+    async def handle_request(self, data: bytes) -> list:
+        """Route raw client request to its backend and return backend response.
+
+        Args:
+            data(bytes): Request received from client.
+        Returns:
+            (list): Encoded parts of response to client.
+
+        """
+        if len(data) > MAX_REQUEST_BYTES:
+            metrics.count_request('UNKNOWN', ResponsePhrase.DNU.name)
+            return forms_response_chunks(ResponsePhrase.DNU)
+        started = time.perf_counter()
+        first_line = parse_first_line(data)
+        finished = time.perf_counter()
+        if first_line is None:
+            metrics.observe('parse', 'UNKNOWN', finished - started)
+            metrics.count_request('UNKNOWN', ResponsePhrase.DNU.name)
+            return forms_response_chunks(ResponsePhrase.DNU)
+        verb, name, _ = first_line
+        metrics.observe('parse', verb.name, finished - started)
+
+        request = data.rstrip(b'\r\n') + REQUEST_END  # Last request of connection could lack end.
+        nodes = self.ring.nodes_for(make_uniq_id(name), 1 + self.replicas)
+        retry = verb.name in RETRIED_NAMES
+        if verb == RequestVerb.GET:
+            response = await self._get(request, nodes)
+        else:
+            response = await self._change(request, nodes, retry)
+        metrics.observe('backend', verb.name, time.perf_counter() - finished)
+        if response is None:
+            metrics.count_request(verb.name, ResponsePhrase.BUSY.name)
+            return BACKEND_DOWN_RESPONSE
+        metrics.count_request(verb.name,
+                              RESPONSE_LABELS.get(response.split(b'\r\n', 1)[0], 'UNKNOWN'))
+        return [response]
+
+    async def close(self) -> None:
+        """Close connections to backends."""
+        for client in self.clients.values():
+            await client.close()
+
+    def stats(self) -> dict:
+        return {'forwarded': self.forwarded, 'failures': self.failures,
+                'failovers': self.failovers, 'replication_failures': self.replication_failures}
+
+    async def _forward(self, node: str, request: bytes, retry: bool) -> Optional[bytes]:
+        """Send request to backend, return None if it is not available."""
+        self.forwarded[node] += 1
+        try:
+            return await self.clients[node].send(request, retry)
+        except (OSError, asyncio.TimeoutError) as error:
+            self.failures[node] += 1
+            logger.warning(f'Backend {node} failed: {error!r}')
+            return None
+
+    async def _get(self, request: bytes, nodes: list) -> Optional[bytes]:
+        """Read from owner, from replicas in ring order if it is down."""
+        for number, node in enumerate(nodes):
+            response = await self._forward(node, request, True)
+            if response is not None:
+                self.failovers += bool(number)
+                return response
+        return None
+
+    async def _change(self, request: bytes, nodes: list, retry: bool) -> Optional[bytes]:
+        """Change data on owner and repeat approved change on replicas."""
+        owner, *replicas = nodes
+        response = await self._forward(owner, request, retry)
+        if response is None or not replicas or not response.startswith(OK_HEADER):
+            return response
+        for replica, replica_response in zip(replicas, await asyncio.gather(
+                *(self._forward(replica, request, retry) for replica in replicas))):
+            if replica_response is None or not replica_response.startswith(REPLICATED_HEADERS):
+                self.replication_failures += 1
+                logger.warning(f'Change is not replicated to {replica}: {replica_response!r}')
+        return response
@@ -0,0 +1,134 @@
+"""Moves users data between databases of sharding proxy backends after nodes change.
+
+Every node is given as 'host:port=db_path': name of backend in --backends
+of the proxy and database directory of that backend. Keys of every node are
+copied to their owners on the new hash ring which don't have them. Nodes
+given with --drain are removed from the ring, all their keys are copied out.
+
+Adding a node:
+    1. Start new backend server with empty database.
+    2. python rebalance.py 127.0.0.1:4001=db1 127.0.0.1:4002=db2 127.0.0.1:4003=db3
+    3. Restart proxy with --backends 127.0.0.1:4001,127.0.0.1:4002,127.0.0.1:4003
+    4. Run step 2 again with --delete: keys written during switch are copied,
+       keys which are not owned by node anymore are deleted from it.
+
+The "log" backend keeps database file open, stop backends before running
+rebalance on them. Data of "files" backend could be copied while they work,
+but restart them after every run: their cache of users keeps answering
+NOT FOUND for copied keys and old records for deleted ones, and with
+KEY_FILTER copied keys are not seen either.
+"""
+
+import argparse
+import asyncio
+import sys
+from typing import Optional
+
+from loguru import logger
+
+from config import BULK_BATCH_SIZE, PROXY_REPLICAS, PROXY_VIRTUAL_NODES, STORAGE_BACKEND
+from proxy import HashRing
+from storage import STORAGE_BACKENDS, Storage, create_storage
+
+
+def parse_node_path(text: str) -> tuple:
+    """Parse 'host:port=db_path' to (node, db_path)."""
+    node, separator, path = text.partition('=')
+    if not separator or not node or not path:
+        raise argparse.ArgumentTypeError(f'Node should be host:port=db_path, got {text!r}')
+    return node, path
+
+
+async def rebalance(storages: dict, ring: HashRing, replicas: int = PROXY_REPLICAS,
+                    delete: bool = False, batch_size: int = BULK_BATCH_SIZE) -> dict:
+    """Copy keys of every storage to their owners on ring.
+
+    Args:
+        storages(dict): Opened storages by node name, nodes missing in ring are drained.
+        ring(HashRing): Hash ring after nodes change.
+        replicas(int): Copies of every key besides the owner, as in proxy.
+        delete(bool): Delete keys from nodes which don't own them.
+        batch_size(int): Keys read and written at once.
+    Returns:
+        dict: Counts of checked, copied and deleted keys.
+
+    """
+    counts = {'checked': 0, 'copied': 0, 'deleted': 0}
+    for node, storage in storages.items():
+        batch = []
+        async for key in storage.keys():
+            batch.append(key)
+            if len(batch) >= batch_size:
+                await _move_batch(node, batch, storages, ring, replicas, delete, counts)
+                batch = []
+        if batch:
+            await _move_batch(node, batch, storages, ring, replicas, delete, counts)
+        logger.info(f'Node {node} is done: {counts}')
+    return counts
+
+
+async def _move_batch(node: str, keys: list, storages: dict, ring: HashRing, replicas: int,
+                      delete: bool, counts: dict) -> None:
+    values = await storages[node].read_many(keys)
+    copies: dict = {}  # Owner: [(key, value)]
+    moved = []
+    for key, value in zip(keys, values):
+        if value is None:
+            continue  # Deleted after listing.
+        counts['checked'] += 1
+        owners = ring.nodes_for(key, 1 + replicas)
+        for owner in owners:
+            if owner != node:
+                copies.setdefault(owner, []).append((key, value))
+        if node not in owners:
+            moved.append(key)
+    for owner, items in copies.items():
+        present = await storages[owner].read_many([key for key, _ in items])
+        missing = [item for item, value in zip(items, present) if value is None]
+        if missing:
+            await storages[owner].write_many(missing)  # Values on owner are newer, kept.
+            counts['copied'] += len(missing)
+    if delete:
+        for key in moved:  # Deleted only after copies are written.
+            counts['deleted'] += await storages[node].delete(key)
+
+
+async def run(args: argparse.Namespace) -> None:
+    ring = HashRing([node for node, _ in args.nodes], args.vnodes)
+    storages: dict[str, Storage] = {}
+    try:
+        for node, path in args.nodes + args.drain:
+            if node in storages:
+                sys.exit(f'Node {node} is given twice')
+            storages[node] = create_storage(args.backend, path)
+            await storages[node].open()
+        counts = await rebalance(storages, ring, args.replicas, args.delete, args.batch_size)
+    finally:
+        for storage in storages.values():
+            await storage.close()
+    logger.info(f'Finished: {counts}')
+
+
+def parse_args(args: Optional[list] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Rebalance data of RKSOK sharding proxy backends.')
+    parser.add_argument('nodes', nargs='+', type=parse_node_path,
+                        help='nodes of the new ring as host:port=db_path')
+    parser.add_argument('--drain', nargs='+', type=parse_node_path, default=[],
+                        help='removed nodes as host:port=db_path, their keys are copied out')
+    parser.add_argument('--replicas', type=int, default=PROXY_REPLICAS)
+    parser.add_argument('--vnodes', type=int, default=PROXY_VIRTUAL_NODES)
+    parser.add_argument('--backend', choices=tuple(STORAGE_BACKENDS), default=STORAGE_BACKEND)
+    parser.add_argument('--batch-size', type=int, default=BULK_BATCH_SIZE)
+    parser.add_argument('--delete', action='store_true',
+                        help='delete keys from nodes which are not their owners')
+    return parser.parse_args(args)
+
+
+if __name__ == '__main__':
+    logger.remove()
+    logger.add(sys.stderr, level='INFO')
+    try:
+        asyncio.run(run(parse_args()))
+    except KeyboardInterrupt:
+        print('\nKeyboard interrupt: rebalance is stopped!')
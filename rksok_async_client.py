@@ -0,0 +1,244 @@
+"""Asynchronous RKSOK client for programs, with connection pool and pipelining.
+
+Example:
+    async with AsyncRKSOKClient('127.0.0.1', 3901) as client:
+        result = await client.write('Иван', '89012345678')
+        results = await client.batch([(RequestVerb.GET, 'Иван', None),
+                                      (RequestVerb.DELETE, 'Иван', None)])
+
+With keep_alive=True (port given by --keep-alive-port of the server)
+requests are pipelined through up to pool_size persistent connections,
+responses come in requests order. With keep_alive=False every request
+uses its own connection and at most pool_size requests run at once.
+"""
+
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from rksok_client import (CanNotParseResponseError, ENCODING, RequestVerb, ResponseStatus,
+                          compose_request, parse_response_status)
+
+
+POOL_SIZE = 4  # Max number of connections to server.
+REQUEST_TIMEOUT = 10.0  # Seconds to wait for response.
+MAX_REQUESTS_PER_CONNECTION = 1000  # Server closes persistent connection after so many requests.
+RETRIED_VERBS = (RequestVerb.GET, RequestVerb.WRITE)  # Safe to repeat if connection was lost.
+
+
+@dataclass(frozen=True)
+class RKSOKResult:
+    """Response of RKSOK server to one request.
+
+    payload is phone for GET, comment of validation server for NOT_APPROVED.
+    """
+
+    verb: RequestVerb
+    name: str
+    status: ResponseStatus
+    payload: str
+    raw: str
+
+    @property
+    def ok(self) -> bool:
+        return self.status == ResponseStatus.OK
+
+
+class _Connection:
+    """Persistent connection with requests waiting for responses in sending order."""
+
+    def __init__(self, server: str, port: int):
+        self._server, self._port = server, port
+        self._opening: Optional[asyncio.Task] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reading: Optional[asyncio.Task] = None
+        self._waiters: deque = deque()  # Futures of responses.
+        self.assigned = 0  # Requests given to connection.
+        self.pending = 0  # Assigned requests without response yet.
+        self.closed = False
+
+    def assign(self) -> None:
+        """Count request which is going to be sent, before connection is opened."""
+        self.assigned += 1
+        self.pending += 1
+
+    async def request(self, request: bytes) -> bytes:
+        """Send assigned request and wait for its response."""
+        try:
+            if self._opening is None:
+                self._opening = asyncio.ensure_future(self._open())
+            await asyncio.shield(self._opening)
+            if self.closed:
+                raise ConnectionResetError('Connection to RKSOK server is closed')
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            self._writer.write(request)  # Requests of concurrent callers go out together.
+            return await waiter
+        finally:
+            self.pending -= 1
+
+    def close(self, error: Optional[Exception] = None) -> None:
+        """Close connection, requests without response fail with error."""
+        self.closed = True
+        if self._reading is not None and self._reading is not asyncio.current_task():
+            self._reading.cancel()
+        if self._writer is not None:
+            self._writer.close()
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_exception(error or ConnectionResetError('Connection is closed'))
+
+    async def _open(self) -> None:
+        try:
+            reader, self._writer = await asyncio.open_connection(self._server, self._port)
+        except OSError:
+            self.closed = True
+            raise
+        self._reading = asyncio.ensure_future(self._read_responses(reader))
+
+    async def _read_responses(self, reader: asyncio.StreamReader) -> None:
+        try:
+            while True:
+                response = await reader.readuntil(b'\r\n\r\n')
+                if not self._waiters:
+                    raise CanNotParseResponseError()  # Response without request.
+                waiter = self._waiters.popleft()
+                if not waiter.done():  # Caller could be cancelled by timeout.
+                    waiter.set_result(response)
+        except asyncio.IncompleteReadError:
+            self.close(ConnectionResetError('RKSOK server closed connection'))
+        except (OSError, asyncio.LimitOverrunError, CanNotParseResponseError) as error:
+            self.close(ConnectionResetError(f'Connection to RKSOK server is broken: {error!r}'))
+
+
+class AsyncRKSOKClient:
+    """Phonebook client for asyncio programs.
+
+    Args:
+        server(str): RKSOK server address.
+        port(int): RKSOK server port.
+        keep_alive(bool): Port of server keeps connections open and accepts pipelined requests.
+        pool_size(int): Max number of connections.
+        timeout(float): Seconds to wait for response.
+
+    """
+
+    def __init__(self, server: str, port: int, keep_alive: bool = True, pool_size: int = POOL_SIZE,
+                 timeout: float = REQUEST_TIMEOUT):
+        self.server, self.port = server, port
+        self.keep_alive, self.pool_size, self.timeout = keep_alive, pool_size, timeout
+        self._connections: list[_Connection] = []
+        self._slots: Optional[asyncio.Semaphore] = None  # Bounds one-shot connections.
+
+    async def __aenter__(self) -> 'AsyncRKSOKClient':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def get(self, name: str) -> RKSOKResult:
+        """Get phone by name."""
+        return await self.request(RequestVerb.GET, name)
+
+    async def write(self, name: str, phone: str) -> RKSOKResult:
+        """Write phone by name."""
+        return await self.request(RequestVerb.WRITE, name, phone)
+
+    async def delete(self, name: str) -> RKSOKResult:
+        """Delete phone by name."""
+        return await self.request(RequestVerb.DELETE, name)
+
+    async def batch(self, operations: Iterable[tuple], return_exceptions: bool = False) -> list:
+        """Send many requests at once and return results in the same order.
+
+        Requests are spread over pool connections, so server could process
+        them in different order, await batches for dependent requests.
+
+        Args:
+            operations(Iterable[tuple]): Tuples of RequestVerb, name and phone or None.
+            return_exceptions(bool): Put errors to results instead of raising the first one.
+        Returns:
+            list: RKSOKResult or exception for every operation.
+
+        """
+        return await asyncio.gather(*(self.request(verb, name, phone)
+                                      for verb, name, phone in operations),
+                                    return_exceptions=return_exceptions)
+
+    async def request(self, verb: RequestVerb, name: str, phone: Optional[str] = None) -> RKSOKResult:
+        """Send one request and return parsed response.
+
+        Raises:
+            ConnectionError: If connection was lost before response.
+            asyncio.TimeoutError: If there is no response during timeout.
+            CanNotParseResponseError: If response is not an RKSOK one.
+
+        """
+        response = await self.send(compose_request(verb, name, phone), verb in RETRIED_VERBS)
+        raw = response.decode(ENCODING)
+        status, payload = parse_response_status(raw)
+        return RKSOKResult(verb, name.strip(), status, payload, raw)
+
+    async def send(self, request: bytes, retry: bool = False) -> bytes:
+        """Send composed request and return raw response.
+
+        Args:
+            request(bytes): Request in RKSOK framing.
+            retry(bool): Repeat request once if persistent connection was closed by server.
+        Raises:
+            ConnectionError: If connection was lost before response.
+            asyncio.TimeoutError: If there is no response during timeout.
+
+        """
+        if not self.keep_alive:
+            return await self._one_shot_request(request)
+        try:
+            return await self._pipelined_request(request)
+        except ConnectionError:
+            if not retry:
+                raise
+            return await self._pipelined_request(request)  # Server closed connection.
+
+    async def close(self) -> None:
+        """Close all connections."""
+        for connection in self._connections:
+            connection.close()
+        self._connections.clear()
+        await asyncio.sleep(0)  # Let transports close.
+
+    async def _one_shot_request(self, request: bytes) -> bytes:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.pool_size)
+        async with self._slots:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.server, self.port), self.timeout)
+            try:
+                writer.write(request)
+                response = await asyncio.wait_for(reader.read(), self.timeout)
+            finally:
+                writer.close()
+        if not response:
+            raise ConnectionResetError('RKSOK server closed connection without response')
+        return response
+
+    async def _pipelined_request(self, request: bytes) -> bytes:
+        connection = self._choose_connection()
+        try:
+            return await asyncio.wait_for(connection.request(request), self.timeout)
+        except asyncio.TimeoutError:
+            connection.close()  # Late response would be taken for response to the next request.
+            raise
+
+    def _choose_connection(self) -> _Connection:
+        """Return the least loaded connection, open a new one if all are busy."""
+        self._connections = [connection for connection in self._connections if not connection.closed]
+        usable = [connection for connection in self._connections
+                  if connection.assigned < MAX_REQUESTS_PER_CONNECTION]
+        idle = min(usable, key=lambda connection: connection.pending, default=None)
+        if idle is None or (idle.pending and len(usable) < self.pool_size):
+            idle = _Connection(self.server, self.port)
+            self._connections.append(idle)
+        idle.assign()
+        return idle
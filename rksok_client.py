@@ -67,6 +67,26 @@ HUMAN_READABLE_ANSWERS = {
 }
 
 
+def compose_request(verb: RequestVerb, name: str, phone: Optional[str] = None) -> bytes:
+    """Composes RKSOK request, returns it as bytes"""
+    request = f"{verb.value} {name.strip()} {PROTOCOL}\r\n"  # Тип, имя, протокол для запроса.
+    if phone: request += f"{phone.strip()}\r\n"  # Телефон если есть.
+    request += "\r\n"  # Спец символы определяющие конец запроса.
+    return request.encode(ENCODING)  # Переводим запрос в бинарные данные.
+
+
+def parse_response_status(raw_response: str) -> tuple[ResponseStatus, str]:
+    """ Returns status of response from RKSOK server and data lines
+        after the status line"""
+    for response_status in ResponseStatus:  # Проверяем какой ответ пришёл от сервера.
+        if raw_response.startswith(f"{response_status.value} "):  # "НОРМАЛДЫКС"/"НИНАШОЛ"/"НИЛЬЗЯ"/"НИПОНЯЛ"
+            break  # Если нужный найдет прерываем поиск.
+    else:
+        raise CanNotParseResponseError()  # Если не найдено, то бросаем Exception.
+    lines = raw_response.split("\r\n\r\n", 1)[0].split("\r\n")[1:]  # Данные без заголовка.
+    return response_status, "\r\n".join(lines)
+
+
 MODE_TO_VERB = {
     1: RequestVerb.GET,
     2: RequestVerb.WRITE,
@@ -77,9 +97,11 @@ MODE_TO_VERB = {
 class RKSOKPhoneBook:
     """Phonebook working with RKSOK server."""
 
-    def __init__(self, server: str, port: int):
+    def __init__(self, server: str, port: int, keep_alive: bool = False):
         self._server, self._port = server, port
+        self._keep_alive = keep_alive  # Сервер не закрывает соединение после ответа.
         self._conn = None
+        self._buffer = b""  # Принятые, но ещё не разобранные данные постоянного соединения.
         self._name, self._phone, self._verb = None, None, None
         self._raw_request, self._raw_response = None, None
 
@@ -99,6 +121,33 @@ class RKSOKPhoneBook:
         human_response = self._parse_response(raw_response)  # Распаршенный ответ в человеко-читаемом состоянии.
         return human_response
 
+    def process_pipelined(self, requests: list) -> list:
+        """ Sends all requests through one persistent connection without waiting
+            for responses, then parses responses in the same order.
+            Request is a tuple of RequestVerb, name and phone or None."""
+        if not self._keep_alive:
+            raise ValueError("Pipelining needs keep_alive connection")
+        bodies = []
+        for verb, name, phone in requests:
+            self._verb, self._name, self._phone = verb, name, phone
+            bodies.append(self._get_request_body())
+        if not self._conn:
+            self._conn = socket.create_connection((self._server, self._port))
+        self._conn.sendall(b"".join(bodies))  # Все запросы уходят одной пачкой.
+        human_responses = []
+        for (verb, name, phone), body in zip(requests, bodies):
+            self._verb, self._name, self._phone = verb, name, phone
+            self._raw_request = body.decode(ENCODING)
+            self._raw_response = self._receive_response_body()
+            human_responses.append(self._parse_response(self._raw_response))
+        return human_responses
+
+    def close(self) -> None:
+        """Closes connection to RKSOK server."""
+        if self._conn:
+            self._conn.close()
+            self._conn, self._buffer = None, b""
+
     def get_raw_request(self) -> Optional[str]:
         """Returns last request in raw string format"""
         return self._raw_request
@@ -119,19 +168,12 @@ class RKSOKPhoneBook:
 
     def _get_request_body(self) -> bytes:
         """Composes RKSOK request, returns it as bytes"""
-        request = f"{self._verb.value} {self._name.strip()} {PROTOCOL}\r\n"  # Тип, имя, протокол для запроса.
-        if self._phone: request += f"{self._phone.strip()}\r\n"  # Телефон если есть.
-        request += "\r\n"  # Спец символы определяющие конец запроса.
-        return request.encode(ENCODING)  # Переводим запрос в бинарные данные.
+        return compose_request(self._verb, self._name, self._phone)
 
     def _parse_response(self, raw_response: str) -> str:
         """Parses response from RKSOK server and returns parsed data"""
-        for response_status in ResponseStatus:  # Проверяем какой ответ пришёл от сервера.
-            if raw_response.startswith(f"{response_status.value} "):  # "НОРМАЛДЫКС"/"НИНАШОЛ"/"НИЛЬЗЯ"/"НИПОНЯЛ"
-                break  # Если нужный найдет прерываем поиск.
-        else:
-            raise CanNotParseResponseError()  # Если не найдено, то бросаем Exception.
-        response_payload = "".join(raw_response.split("\r\n")[1:])  # Данные без заголовка. тел/уже едем
+        response_status, response_payload = parse_response_status(raw_response)
+        response_payload = response_payload.replace("\r\n", "")  # Данные без заголовка. тел/уже едем
         if response_status == ResponseStatus.NOT_APPROVED:  # Если сервер проверки запретил обработку запроса.
             response_payload = f"\nКомментарий органов: {response_payload}"  # Добавляем к данным строку.
         return HUMAN_READABLE_ANSWERS.get(self._verb).get(response_status) \
@@ -141,6 +183,8 @@ class RKSOKPhoneBook:
     def _receive_response_body(self) -> str:
         """ Receives data from socket connection and returns it as string,
             decoded using ENCODING"""
+        if self._keep_alive:
+            return self._receive_framed_response()
         response = b""
         while True:
             data = self._conn.recv(1024)  # Сокет ожидает данных от сервера.
@@ -148,6 +192,20 @@ class RKSOKPhoneBook:
             response += data  # Сохраняем ответ в бинарном виде.
         return response.decode(ENCODING)  # Возвращаем декодированный ответ от сервера.
 
+    def _receive_framed_response(self) -> str:
+        """ Receives one response ended by empty line from persistent
+            connection and returns it as string, decoded using ENCODING"""
+        while b"\r\n\r\n" not in self._buffer:
+            data = self._conn.recv(1024)
+            if not data:  # Сервер закрыл соединение.
+                response, self._buffer = self._buffer, b""
+                self._conn.close()
+                self._conn = None
+                return response.decode(ENCODING)
+            self._buffer += data
+        response, self._buffer = self._buffer.split(b"\r\n\r\n", 1)
+        return (response + b"\r\n\r\n").decode(ENCODING)
+
 
 def get_server_and_port() -> tuple[str, int]:
     """Returns Server and Port from command-line arguments."""
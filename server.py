@@ -1,74 +1,659 @@
 """RKSOK protocol server."""
 
+import argparse
 import asyncio
+from collections import deque
+from functools import partial
+import os
+import signal
 import sys
+import time
 import traceback
+from typing import Optional, Union
 
 from loguru import logger
+try:
+    import uvloop
+except ImportError:  # uvloop is optional.
+    uvloop = None
 
-from config import ENCODING, RequestVerb, ResponsePhrase
-from parse_data import parse_client_request, forms_response_to_client
-from process_data import write_new_user, get_user, delete_user
-from validation import validation_server_request
+from admission import BUSY_RESPONSE, admission
+from config import (ACCESS_LOG_FILE, CONNECTION_HANDLER, ENCODING, EVENT_LOOP, GET_PREFETCH,
+                    KEEP_ALIVE_IDLE_TIMEOUT, KEEP_ALIVE_MAX_REQUESTS, MAX_REQUEST_BYTES,
+                    METRICS_ADDR, PIPELINE_MAX_QUEUED, PROXY_REPLICAS, READ_BUFFER_SIZE,
+                    READ_TIMEOUT, REJECT_LINGER, STORAGE_TIMEOUT, VALIDATION_SERVER_PORT,
+                    VALIDATION_SERVER_URL, VALIDATION_TIMEOUT, WRITE_TIMEOUT, RequestVerb,
+                    ResponsePhrase)
+from logging_setup import access_logger, setup_logging
+from metrics import admin_handlers, dump_metrics, metrics, process_metrics_request
+from parse_data import VERBS, RKSOKRequest, forms_response_chunks, parse_request
+from process_data import (close_storage, delete_user, get_user, key_filter, open_storage, storage,
+                          use_shared_storage, user_cache_stats, write_new_user)
+from profiling import profiler
+from proxy import ShardingProxy
+from validation import (APPROVED, cached_validation_request, degraded_stats, validation_breaker,
+                        validation_pool, verdict_cache)
+from workers import run_workers
 
 
-async def process_client_request(reader, writer):
-    """Await client response and process it.
+async def process_approved_request(request: RKSOKRequest) -> Union[ResponsePhrase, tuple]:
+    """Process request allowed by validation server with database.
 
     Args:
-        reader: A stream to recieve any data from client.
-        writer: A stream to dispatch parsed and processed client data.
+        request(RKSOKRequest): Parsed request from client.
+    Returns:
+        Union[ResponsePhrase, tuple]: Response phrase with user data if there is.
+
+    """
+    if request.verb == RequestVerb.GET:
+        return await get_user(request.name, request.encoded_name)
+    if request.verb == RequestVerb.WRITE:
+        return await write_new_user(request.body, request.name, request.encoded_name)
+    return await delete_user(request.name, request.encoded_name)
+
+
+prefetch_stats = {'requests': 0, 'discarded': 0, 'saved_seconds': 0.0}
+
+
+async def _timed_get_user(name: str, encoded_name: str) -> tuple:
+    started = time.perf_counter()
+    processed_client_request = await get_user(name, encoded_name)
+    return processed_client_request, time.perf_counter() - started
+
+
+async def validate_with_prefetch(request: RKSOKRequest) -> tuple:
+    """Validate GET request and start reading user from database at the same time.
+
+    Args:
+        request(RKSOKRequest): Parsed GET request from client.
+    Returns:
+        tuple: Validation server response and reading task or None if not allowed.
+
+    """
+    prefetch = asyncio.ensure_future(asyncio.wait_for(
+        _timed_get_user(request.name, request.encoded_name), STORAGE_TIMEOUT))
+    try:
+        validation_server_response = await cached_validation_request(request)
+    except BaseException:
+        prefetch.cancel()
+        await asyncio.gather(prefetch, return_exceptions=True)
+        raise
+
+    prefetch_stats['requests'] += 1
+    if not validation_server_response.startswith(APPROVED):
+        prefetch.cancel()  # Prefetched data is dropped and never sent to client.
+        await asyncio.gather(prefetch, return_exceptions=True)
+        prefetch_stats['discarded'] += 1
+        return validation_server_response, None
+    return validation_server_response, prefetch
+
+
+async def read_prefetched(prefetch: asyncio.Future) -> tuple:
+    """Wait for user read by validate_with_prefetch().
+
+    Returns:
+        tuple: Processed request and seconds of reading.
+    Raises:
+        asyncio.TimeoutError: If reading is longer than STORAGE_TIMEOUT.
+
+    """
+    started = time.perf_counter()
+    processed_client_request, read_time = await prefetch
+    saved = read_time - (time.perf_counter() - started)  # Time of reading during validation.
+    prefetch_stats['saved_seconds'] += saved
+    logger.debug('GET prefetch saved {:.3f} ms', saved * 1000)
+    return processed_client_request, read_time
+
+
+def verb_label(data: bytes) -> str:
+    """Return name of request verb for metrics without parsing request."""
+    for verb, verb_bytes in VERBS:
+        if data.startswith(verb_bytes):
+            return verb.name
+    return 'UNKNOWN'
+
+
+async def handle_request(data: bytes) -> list:
+    """Parse, validate and process raw client request.
+
+    Args:
+        data(bytes): Request received from client.
+    Returns:
+        (list): Encoded parts of response to client.
 
     """
+    if len(data) > MAX_REQUEST_BYTES:
+        admission.oversized()
+        metrics.count_request('UNKNOWN', ResponsePhrase.DNU.name)
+        return forms_response_chunks(ResponsePhrase.DNU)
+    started = time.perf_counter()
+    request = parse_request(data)
+    finished = time.perf_counter()
+    if request is None:  # Not correct request from client.
+        metrics.observe('parse', 'UNKNOWN', finished - started)
+        metrics.count_request('UNKNOWN', ResponsePhrase.DNU.name)
+        return forms_response_chunks(ResponsePhrase.DNU)
+    verb = request.verb.name
+    metrics.observe('parse', verb, finished - started)
+
+    if not admission.start_validation():
+        metrics.count_request(verb, ResponsePhrase.BUSY.name)
+        return BUSY_RESPONSE
+    started = finished
+    prefetch = None
+    try:
+        if GET_PREFETCH and request.verb == RequestVerb.GET:
+            validation_server_response, prefetch = await asyncio.wait_for(
+                validate_with_prefetch(request), VALIDATION_TIMEOUT)
+        else:
+            validation_server_response = await asyncio.wait_for(
+                cached_validation_request(request), VALIDATION_TIMEOUT)
+    except asyncio.TimeoutError:
+        admission.timeout('validate')
+        metrics.count_request(verb, ResponsePhrase.BUSY.name)
+        return BUSY_RESPONSE
+    finally:
+        admission.finish_validation()
+    finished = time.perf_counter()
+    metrics.observe('validate', verb, finished - started)
+
+    if not validation_server_response.startswith(APPROVED):
+        metrics.count_request(verb, ResponsePhrase.N_APPR.name)
+        return [validation_server_response]  # If validation server not allow process client request.
+    try:
+        if prefetch is not None:  # Is read with validation.
+            processed_client_request, storage_time = await read_prefetched(prefetch)
+        else:
+            processed_client_request = await asyncio.wait_for(
+                process_approved_request(request), STORAGE_TIMEOUT)
+            storage_time = time.perf_counter() - finished
+    except asyncio.TimeoutError:
+        admission.timeout('storage')
+        metrics.count_request(verb, ResponsePhrase.BUSY.name)
+        return BUSY_RESPONSE
+    metrics.observe('storage', verb, storage_time)
+    phrase = (processed_client_request[0] if type(processed_client_request) is tuple
+              else processed_client_request)
+    metrics.count_request(verb, phrase.name)
+    return forms_response_chunks(processed_client_request)
+
+
+async def _read_request(reader) -> bytes:
     data = b''
+    started = None  # Time of the first received block.
     while True:  # reading all data from client by 1kb blocks
         line = await reader.read(1024)
+        if started is None:
+            started = time.perf_counter()
         data += line
-        if data.endswith(b'\r\n\r\n') or not line:
-            break
-    decoded_message = data.decode(ENCODING)
+        if data.endswith(b'\r\n\r\n') or not line or len(data) > MAX_REQUEST_BYTES:
+            metrics.observe('receive', verb_label(data), time.perf_counter() - started)
+            return data
+
+
+async def _send_response(writer, response_to_client: list, verb: str = 'UNKNOWN') -> None:
+    started = time.perf_counter()
+    writer.writelines(response_to_client)
+    try:
+        await asyncio.wait_for(writer.drain(), WRITE_TIMEOUT)
+    except asyncio.TimeoutError:
+        admission.timeout('write')
+        writer.transport.abort()
+        return
+    metrics.observe('write', verb, time.perf_counter() - started)
+
+
+def log_access(addr, data: bytes, response_to_client: list, started: float) -> None:
+    """Write one line about processed request to access log.
+
+    Args:
+        addr: Client address.
+        data(bytes): Raw request.
+        response_to_client(list): Encoded parts of response.
+        started(float): time.perf_counter() when request was received.
+
+    """
+    if not ACCESS_LOG_FILE:
+        return
+    client = f'{addr[0]}:{addr[1]}' if addr else '-'
+    verb = data.split(b'\r\n', 1)[0].split(b' ', 1)[0].decode(ENCODING, 'replace')
+    status = response_to_client[0].split(b' ', 1)[0].decode(ENCODING, 'replace')
+    access_logger.info('{} {} {} {} {} {:.3f}ms', client, verb or '-', status, len(data),
+                       sum(map(len, response_to_client)), (time.perf_counter() - started) * 1000)
+
+
+async def _reject_connection(reader, writer) -> None:
+    """Send busy response and close connection after client stops sending or REJECT_LINGER."""
+    async def skip_incoming_data():
+        while await reader.read(1024):  # Unread data would reset connection with response.
+            pass
+
+    writer.writelines(BUSY_RESPONSE)
+    try:
+        writer.write_eof()
+        await asyncio.wait_for(skip_incoming_data(), REJECT_LINGER)
+    except (ConnectionError, asyncio.TimeoutError):
+        pass
+    finally:
+        writer.close()
+        admission.close_rejected()
+
+
+async def process_client_request(reader, writer, handle=handle_request):
+    """Await client response and process it.
+
+    Args:
+        reader: A stream to recieve any data from client.
+        writer: A stream to dispatch parsed and processed client data.
+        handle: Coroutine function making response parts from raw request.
+
+    """
+    if not admission.open_connection():
+        await _reject_connection(reader, writer)
+        return
+    try:
+        try:
+            data = await asyncio.wait_for(_read_request(reader), READ_TIMEOUT)
+        except asyncio.TimeoutError:
+            admission.timeout('read')
+            data = b''
+        started = time.perf_counter()
+        addr = writer.get_extra_info('peername')
+        logger.debug('\nRECEIVED FROM: {}:\n{}\n', addr, data)
+
+        response_to_client = await handle(data)
+        await _send_response(writer, response_to_client, verb_label(data))
+        logger.debug('\nRESPONSE_TO_CLIENT:\n{}', response_to_client)
+        log_access(addr, data, response_to_client, started)
+    except ConnectionError:
+        pass  # Client gone.
+    finally:
+        writer.close()
+        admission.close_connection()
+
+
+async def process_persistent_connection(reader, writer, handle=handle_request):
+    """Process consecutive requests from one connection, responses are sent in requests order.
+
+    Connection is closed by client, after KEEP_ALIVE_IDLE_TIMEOUT seconds
+    without requests or after KEEP_ALIVE_MAX_REQUESTS requests.
+
+    Args:
+        reader: A stream to recieve any data from client.
+        writer: A stream to dispatch parsed and processed client data.
+        handle: Coroutine function making response parts from raw request.
+
+    """
+    if not admission.open_connection():
+        await _reject_connection(reader, writer)
+        return
     addr = writer.get_extra_info('peername')
-    logger.debug(f'\nRECEIVED FROM: {addr}:\nENCODED:\n{data}\nDECODED:\n{decoded_message}\n')
-
-    parsed_request = parse_client_request(decoded_message)
-    if parsed_request:
-        requested_verb, name, encoded_name, request_body = parsed_request
-        validation_server_response = await validation_server_request(decoded_message)
-
-        if validation_server_response.startswith(ResponsePhrase.APPR.value):
-            if requested_verb == RequestVerb.GET:
-                processed_client_request = await get_user(name, encoded_name)
-            elif requested_verb == RequestVerb.WRITE:
-                processed_client_request = await write_new_user(request_body, name, encoded_name)
-            elif requested_verb == RequestVerb.DELETE:
-                processed_client_request = await delete_user(name, encoded_name)
-            response_to_client = forms_response_to_client(processed_client_request)
-        else:  # If validation server not allow process client request.
-            response_to_client = validation_server_response
-    else:  # Not correct request from client.
-        response_to_client = forms_response_to_client(ResponsePhrase.DNU)
-
-    writer.write(f"{response_to_client}".encode(ENCODING))
-    await writer.drain()
-    writer.close()
-    logger.debug(f'\nRESPONSE_TO_CLIENT:\n{response_to_client}')
-
-
-async def turn_on_server():
+    try:
+        for _ in range(KEEP_ALIVE_MAX_REQUESTS):
+            try:
+                data = await asyncio.wait_for(
+                    reader.readuntil(b'\r\n\r\n'), KEEP_ALIVE_IDLE_TIMEOUT)
+            except asyncio.IncompleteReadError as error:
+                if not error.partial:
+                    break
+                data = error.partial  # Last request without terminator before EOF.
+            started = time.perf_counter()
+            logger.debug('\nRECEIVED FROM: {}:\n{}\n', addr, data)
+            response_to_client = await handle(data)
+            await _send_response(writer, response_to_client, verb_label(data))
+            logger.debug('\nRESPONSE_TO_CLIENT:\n{}', response_to_client)
+            log_access(addr, data, response_to_client, started)
+            if writer.is_closing():
+                break
+    except asyncio.TimeoutError:
+        pass  # Idle connection.
+    except asyncio.LimitOverrunError:
+        admission.oversized()
+        await _send_response(writer, forms_response_chunks(ResponsePhrase.DNU))
+    except ConnectionError:
+        pass  # Client gone.
+    finally:
+        writer.close()
+        admission.close_connection()
+
+
+class RKSOKProtocol(asyncio.BufferedProtocol):
+    """Connection handler working with transport directly.
+
+    Incoming data is received into reusable buffer, end of request is
+    searched only in new data. Requests are processed one by one by
+    handle() and responses are sent in requests order. Reading is paused
+    while more than PIPELINE_MAX_QUEUED requests wait for processing.
+
+    Args:
+        keep_alive(bool): Process many requests from connection, else close it after first one.
+        handle: Coroutine function making response parts from raw request.
+
+    """
+
+    def __init__(self, keep_alive: bool = False, handle=handle_request):
+        self.keep_alive, self._handle = keep_alive, handle
+        self._buffer = bytearray(READ_BUFFER_SIZE)
+        self._length = 0  # Size of received data in buffer.
+        self._searched = 0  # Size of data in buffer without end of request.
+        self._requests: deque = deque()
+        self._processed = 0
+        self._transport: Optional[asyncio.Transport] = None
+        self._processing: Optional[asyncio.Task] = None
+        self._can_write = asyncio.Event()
+        self._can_write.set()
+        self._read_timer: Optional[asyncio.TimerHandle] = None
+        self._eof = False  # No more requests, close connection after responses.
+        self._backlog_paused = False  # Reading is paused until queued requests are processed.
+        self._admitted = False
+        self._rejected = False  # Connection is answered busy and waits to be closed.
+        self._receive_started = 0.0  # Time of the first byte of the next request.
+
+    def connection_made(self, transport: asyncio.Transport) -> None:
+        self._transport = transport
+        if not admission.open_connection():
+            transport.writelines(BUSY_RESPONSE)
+            transport.write_eof()  # Incoming data is dropped until client closes connection.
+            self._rejected = True
+            self._read_timer = asyncio.get_running_loop().call_later(REJECT_LINGER, transport.close)
+            return
+        self._admitted = True
+        self._reset_read_timer()
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        if len(self._buffer) - self._length < max(sizehint, 1024):
+            self._buffer.extend(bytes(max(len(self._buffer), sizehint)))  # Grow twice or by hint.
+        return memoryview(self._buffer)[self._length:]
+
+    def buffer_updated(self, nbytes: int) -> None:
+        if not self._admitted:
+            return  # Connection is rejected, data is not stored.
+        if not self._length:
+            self._receive_started = time.perf_counter()
+        self._length += nbytes
+        while True:
+            end = self._buffer.find(b'\r\n\r\n', max(0, self._searched - 3), self._length)
+            if end < 0:
+                self._searched = self._length
+                if self._length > MAX_REQUEST_BYTES:
+                    admission.oversized()
+                    self._reject_request()
+                break
+            self._add_request(end + 4)
+            if not self.keep_alive:
+                self._transport.pause_reading()  # The only request is received.
+                break
+
+    def eof_received(self) -> bool:
+        if not self._admitted:
+            return False
+        self._eof = True
+        if self._length:  # Last request without terminator.
+            self._add_request(self._length)
+        elif self._processing is None:
+            return False  # Nothing to answer, close transport.
+        return True  # Transport is closed after responses are sent.
+
+    def pause_writing(self) -> None:
+        self._can_write.clear()
+
+    def resume_writing(self) -> None:
+        self._can_write.set()
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        if self._read_timer is not None:
+            self._read_timer.cancel()
+        self._can_write.set()
+        self._release_admission()
+        if self._rejected:
+            admission.close_rejected()
+            self._rejected = False
+
+    def _release_admission(self) -> None:
+        if self._admitted:
+            admission.close_connection()
+            self._admitted = False
+
+    def _add_request(self, size: int) -> None:
+        request = bytes(self._buffer[:size])
+        now = time.perf_counter()
+        metrics.observe('receive', verb_label(request), now - self._receive_started)
+        self._receive_started = now  # Pipelined request in the tail is already being received.
+        self._requests.append(request)
+        tail = self._length - size
+        self._buffer[:tail] = self._buffer[size:self._length]  # Buffer size isn't changed.
+        self._length = tail
+        self._searched = 0
+        if len(self._requests) > PIPELINE_MAX_QUEUED and not self._backlog_paused:
+            self._backlog_paused = True
+            self._transport.pause_reading()
+        self._start_processing()
+
+    def _reject_request(self) -> None:
+        """Stop reading and answer as to not correct request."""
+        self._transport.pause_reading()
+        self._eof = True
+        self._length = self._searched = 0
+        self._requests.append(b'')
+        self._start_processing()
+
+    def _start_processing(self) -> None:
+        if self._read_timer is not None:
+            self._read_timer.cancel()
+            self._read_timer = None
+        if self._processing is None:
+            self._processing = asyncio.ensure_future(self._process_requests())
+
+    def _reset_read_timer(self) -> None:
+        if self._read_timer is not None:
+            self._read_timer.cancel()
+        self._read_timer = asyncio.get_running_loop().call_later(
+            KEEP_ALIVE_IDLE_TIMEOUT if self.keep_alive else READ_TIMEOUT, self._read_timed_out)
+
+    def _read_timed_out(self) -> None:
+        self._read_timer = None
+        if self.keep_alive and not self._length:
+            self._transport.close()  # Idle persistent connection.
+            return
+        admission.timeout('read')
+        self._reject_request()
+
+    async def _process_requests(self) -> None:
+        try:
+            while self._requests:
+                data = self._requests.popleft()
+                if self._backlog_paused and len(self._requests) <= PIPELINE_MAX_QUEUED // 2:
+                    self._backlog_paused = False
+                    if self.keep_alive and not self._eof:  # Else reading is stopped for good.
+                        self._transport.resume_reading()
+                started = time.perf_counter()
+                logger.opt(lazy=True).debug(
+                    '\nRECEIVED FROM: {}:\n{}\n', lambda: self._transport.get_extra_info('peername'),
+                    lambda: data)
+                try:
+                    response_to_client = await self._handle(data)
+                except Exception:
+                    logger.exception('Request processing failed, connection is closed')
+                    self._transport.abort()
+                    self._release_admission()
+                    return
+                write_started = time.perf_counter()
+                try:
+                    await asyncio.wait_for(self._can_write.wait(), WRITE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    admission.timeout('write')
+                    self._transport.abort()
+                    return
+                if self._transport.is_closing():
+                    return
+                self._transport.writelines(response_to_client)
+                metrics.observe('write', verb_label(data), time.perf_counter() - write_started)
+                logger.debug('\nRESPONSE_TO_CLIENT:\n{}', response_to_client)
+                log_access(self._transport.get_extra_info('peername'), data, response_to_client, started)
+                self._processed += 1
+                if not self.keep_alive or self._processed >= KEEP_ALIVE_MAX_REQUESTS:
+                    self._transport.close()
+                    return
+        finally:
+            self._processing = None
+        if self._eof:
+            self._transport.close()
+        elif not self._transport.is_closing():
+            self._reset_read_timer()
+
+
+def parse_args(args: Optional[list] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='RKSOK protocol server.')
+    parser.add_argument('addr', help='ip address to serve on, 0.0.0.0 for all')
+    parser.add_argument('port', type=int, help='port for one request per connection clients')
+    parser.add_argument('--keep-alive-port', type=int,
+                        help='port for persistent connections with many requests')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of server processes sharing the ports')
+    parser.add_argument('--handler', choices=('stream', 'protocol'), default=CONNECTION_HANDLER,
+                        help='connection handler: streams or low-level protocol')
+    parser.add_argument('--loop', choices=('asyncio', 'uvloop'), default=EVENT_LOOP,
+                        help='event loop implementation')
+    parser.add_argument('--validation-addr', default=VALIDATION_SERVER_URL,
+                        help='validation server address')
+    parser.add_argument('--validation-port', type=int, default=VALIDATION_SERVER_PORT,
+                        help='validation server port')
+    parser.add_argument('--metrics-port', type=int,
+                        help=f'port of HTTP metrics endpoint on {METRICS_ADDR}, '
+                             'workers use the following ports')
+    parser.add_argument('--backends', type=lambda text: text.split(','),
+                        help='run as sharding proxy to backends host:port,... (their keep-alive ports)')
+    parser.add_argument('--replicas', type=int, default=PROXY_REPLICAS,
+                        help='backends getting copies of WRITE and DELETE in proxy mode')
+    parser.add_argument('--metrics-file', help='file to dump metrics to periodically, '
+                                                'workers add pid to the name')
+    parser.add_argument('--no-metrics', action='store_true',
+                        help="don't record latency and requests, to measure overhead of metrics")
+    return parser.parse_args(args)
+
+
+async def start_server(handler: str, keep_alive: bool, addr: str, port: int,
+                       reuse_port: bool, handle=handle_request) -> asyncio.AbstractServer:
+    """Start listening with stream or protocol connection handler, requests are passed to handle."""
+    if handler == 'protocol':
+        return await asyncio.get_running_loop().create_server(
+            lambda: RKSOKProtocol(keep_alive, handle), addr, port, reuse_port=reuse_port)
+    return await asyncio.start_server(
+        partial(process_persistent_connection if keep_alive else process_client_request,
+                handle=handle),
+        addr, port, reuse_port=reuse_port, limit=MAX_REQUEST_BYTES)
+
+
+def register_metrics_collectors(proxy: Optional[ShardingProxy] = None) -> None:
+    """Expose stats of server modules as metrics gauges, only proxy ones in proxy mode."""
+    metrics.register_collector('admission', admission.stats)
+    if proxy is not None:
+        metrics.register_collector('proxy', proxy.stats)
+        return
+    metrics.register_collector('verdict_cache', verdict_cache.stats)
+    metrics.register_collector('validation_breaker', validation_breaker.stats)
+    metrics.register_collector('degraded', lambda: {'verdicts': degraded_stats})
+    metrics.register_collector('user_cache', user_cache_stats)
+    metrics.register_collector('key_filter', key_filter.stats)
+    metrics.register_collector('storage', storage.stats)
+    if GET_PREFETCH:
+        metrics.register_collector('get_prefetch', lambda: prefetch_stats)
+
+
+async def turn_on_server(args: argparse.Namespace):
     """Start server and print address of new connection."""
-    addr, port = sys.argv[1], int(sys.argv[2])  # get address and port from command line arguments.
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    loop.add_signal_handler(signal.SIGUSR1, profiler.start)
+    admin_handlers['/profile'] = profiler.handle_admin_request
+    reuse_port = args.workers > 1  # Kernel balances connections between workers.
+    validation_pool.host, validation_pool.port = args.validation_addr, args.validation_port
+    proxy = ShardingProxy(args.backends, args.replicas) if args.backends else None
+    if proxy is None:
+        await open_storage()
+    register_metrics_collectors(proxy)
+    if args.no_metrics:
+        metrics.disable()
+    handle = handle_request if proxy is None else proxy.handle_request
+    servers = [await start_server(args.handler, False, args.addr, args.port, reuse_port, handle)]
+    if args.keep_alive_port:
+        servers.append(await start_server(
+            args.handler, True, args.addr, args.keep_alive_port, reuse_port, handle))
+    if args.metrics_port:
+        servers.append(await asyncio.start_server(
+            process_metrics_request, METRICS_ADDR, args.metrics_port))
+        logger.info(f'Metrics on http://{METRICS_ADDR}:{args.metrics_port}/')
+    dump = asyncio.ensure_future(dump_metrics(args.metrics_file)) if args.metrics_file else None
+    print(f'Serving on {args.addr}\n')
+    try:
+        await asyncio.gather(*(server.serve_forever() for server in servers))
+    finally:
+        if dump is not None:
+            dump.cancel()
+        await profiler.stop()
+        for server in servers:
+            server.close()
+        if proxy is not None:
+            await proxy.close()
+            logger.info(f'Proxy stats: {proxy.stats()}')
+            return
+        await validation_pool.close()
+        key_filter_stats = key_filter.stats()  # Filter is forgotten when storage is closed.
+        await close_storage()
+        logger.info(f'Verdict cache stats: {verdict_cache.stats()}')
+        logger.info(f'Validation breaker stats: {validation_breaker.stats()}, '
+                    f'degraded verdicts: {degraded_stats}')
+        logger.info(f'User cache stats: {user_cache_stats()}')
+        logger.info(f'Key filter stats: {key_filter_stats}')
+        logger.info(f'Admission stats: {admission.stats()}')
+        if GET_PREFETCH:
+            logger.info(f'GET prefetch stats: {prefetch_stats}')
+
 
-    server = await asyncio.start_server(
-        process_client_request, addr, port)
-    print(f'Serving on {addr}\n')
-    async with server:
-        await server.serve_forever()
+def run_server(args: argparse.Namespace) -> None:
+    """Run server in current process until it is stopped."""
+    if args.loop == 'uvloop':
+        if uvloop is None:
+            logger.warning('uvloop is not installed, default asyncio event loop is used')
+        else:
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    try:
+        asyncio.run(turn_on_server(args))
+    except asyncio.CancelledError:
+        print('\nSIGTERM: Server shutdown!')
+
+
+def run_worker(args: argparse.Namespace, number: int) -> None:
+    """Run server in worker process with its own log files and metrics.
+
+    Args:
+        args(argparse.Namespace): Command line arguments.
+        number(int): Worker number from 0, the same for restarted worker.
+
+    """
+    suffix = f'.{os.getpid()}'
+    setup_logging(suffix=suffix)
+    if args.metrics_port:
+        args.metrics_port += number  # Changes args of this process only.
+    if args.metrics_file:
+        args.metrics_file += suffix
+    run_server(args)
 
 
 if __name__ == '__main__':
-    logger.add("logs/debug.log", format="{time} {level} {message}")
+    args = parse_args()
+    setup_logging(files=args.workers == 1)
     try:
-        asyncio.run(turn_on_server())
+        if args.workers > 1:
+            try:
+                if not args.backends:  # Proxy doesn't use storage.
+                    use_shared_storage()
+            except ValueError as error:
+                sys.exit(str(error))
+            run_workers(args.workers, lambda number: run_worker(args, number))
+        else:
+            run_server(args)
     except KeyboardInterrupt:
         print('\nKeyboard interrupt: Server shutdown!')
     except Exception:
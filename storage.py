@@ -0,0 +1,522 @@
+"""Storage backends for users data.
+
+Every backend stores text value by unique key made by make_uniq_id() and
+implements the same async interface: open, close, read, read_many, write,
+write_many, delete, keys.
+
+Durability levels: "none" - data is left in page cache, "batched" - write
+returns after one fsync shared with writes made within GROUP_COMMIT_WINDOW,
+"per-write" - write returns after its own fsync.
+"""
+
+import asyncio
+import itertools
+import os
+import struct
+from typing import AsyncIterator, Awaitable, Callable, Optional
+import zlib
+
+import aiofiles
+from aiofiles.os import remove
+from loguru import logger
+
+from config import (ENCODING, DB_PATH, LOG_STORAGE_FILE, COMPACTION_MIN_GARBAGE_BYTES,
+                    COMPACTION_GARBAGE_RATIO, DURABILITY, GROUP_COMMIT_WINDOW)
+
+
+DURABILITY_LEVELS = ('none', 'batched', 'per-write')
+
+
+def _fsync_and_close(fd: int) -> None:
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _fsync_path(path: str) -> None:
+    """Fsync file or directory by path, directory fsync makes renames and deletes durable."""
+    _fsync_and_close(os.open(path, os.O_RDONLY))
+
+
+class GroupCommit:
+    """Completes operations submitted within window by one flush call.
+
+    Args:
+        flush(Callable[[list], Awaitable[None]]): Makes list of submitted items durable.
+        window(float): Seconds to collect items after the first one.
+
+    """
+
+    def __init__(self, flush: Callable[[list], Awaitable[None]], window: float = GROUP_COMMIT_WINDOW):
+        self.flush, self.window = flush, window
+        self._items: list = []
+        self._done: Optional[asyncio.Future] = None
+        self.commits, self.operations = 0, 0
+
+    async def submit(self, item=None) -> None:
+        """Wait until item is flushed together with others.
+
+        Raises:
+            OSError: If flush failed.
+
+        """
+        self._items.append(item)
+        if self._done is None:
+            self._done = asyncio.get_running_loop().create_future()
+            self._done.add_done_callback(lambda done: done.cancelled() or done.exception())
+            asyncio.ensure_future(self._commit(self._done))
+        await asyncio.shield(self._done)  # Cancelled caller should not cancel the commit.
+
+    async def _commit(self, done: asyncio.Future) -> None:
+        await asyncio.sleep(self.window)
+        items, self._items, self._done = self._items, [], None
+        try:
+            await self.flush(items)
+        except Exception as error:
+            done.set_exception(error)
+        else:
+            done.set_result(None)
+        self.commits += 1
+        self.operations += len(items)
+
+    async def drain(self) -> None:
+        """Wait for commit of already submitted items."""
+        if self._done is not None:
+            await asyncio.gather(asyncio.shield(self._done), return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {'group_commits': self.commits, 'group_committed_operations': self.operations}
+
+
+class Storage:
+    """Interface of users data storage."""
+
+    MULTIPROCESS_SAFE = False  # Could several processes use the same storage at once.
+    CHEAP_MISSES = False  # Lookup of absent key doesn't touch the filesystem.
+
+    async def open(self) -> None:
+        """Prepare storage for work."""
+
+    async def close(self) -> None:
+        """Release storage resources."""
+
+    async def read(self, key: str) -> Optional[str]:
+        """Return value by key or None if there is no such key."""
+        raise NotImplementedError
+
+    async def read_many(self, keys: list) -> list:
+        """Return values of keys, None for absent ones."""
+        return [await self.read(key) for key in keys]
+
+    async def write(self, key: str, value: str) -> None:
+        """Create or rewrite value by key."""
+        raise NotImplementedError
+
+    async def write_many(self, items: list) -> None:
+        """Create or rewrite values of list of (key, value) pairs."""
+        for key, value in items:
+            await self.write(key, value)
+
+    async def delete(self, key: str) -> bool:
+        """Delete value by key, return False if there was no such key."""
+        raise NotImplementedError
+
+    async def keys(self) -> AsyncIterator[str]:
+        """Iterate over all stored keys."""
+        raise NotImplementedError
+        yield
+
+    def stats(self) -> dict:
+        """Return backend specific counters."""
+        return {}
+
+
+def check_durability(durability: str) -> None:
+    """Raise ValueError if durability is not one of DURABILITY_LEVELS."""
+    if durability not in DURABILITY_LEVELS:
+        raise ValueError(f'Unknown durability: {durability}, expected one of {DURABILITY_LEVELS}')
+
+
+class FileStorage(Storage):
+    """File per user storage, file name is the user key.
+
+    Files are written to a temporary file and renamed, so readers and other
+    processes see either old or new value. Temporary names have dots and
+    are not listed as keys.
+
+    Args:
+        path(str): Directory with users files.
+        durability(str): One of DURABILITY_LEVELS.
+
+    """
+
+    MULTIPROCESS_SAFE = True
+
+    def __init__(self, path: str = DB_PATH, durability: str = DURABILITY):
+        check_durability(durability)
+        self.path, self.durability = path, durability
+        self._group = GroupCommit(self._flush)
+        self._temp_numbers = itertools.count()
+
+    def file_path(self, key: str) -> str:
+        """Return file path for key, base64 '/' is replaced to be a valid file name."""
+        return os.path.join(self.path, key.replace('/', '-'))
+
+    async def open(self) -> None:
+        os.makedirs(self.path, exist_ok=True)
+
+    async def close(self) -> None:
+        await self._group.drain()
+
+    async def read(self, key: str) -> Optional[str]:
+        try:
+            async with aiofiles.open(self.file_path(key), 'r', encoding=ENCODING) as f:
+                return await f.read()
+        except (FileExistsError, FileNotFoundError):
+            return None
+
+    async def write(self, key: str, value: str) -> None:
+        path = self.file_path(key)
+        temp_path = f'{path}.{os.getpid()}.{next(self._temp_numbers)}.tmp'
+        loop = asyncio.get_running_loop()
+        if self.durability == 'batched':  # File is renamed after fsync with others.
+            await loop.run_in_executor(None, self._write_temp, temp_path, value, False)
+            await self._group.submit((temp_path, path))
+        else:
+            await loop.run_in_executor(None, self._write_file, temp_path, path, value)
+
+    async def read_many(self, keys: list) -> list:
+        """Read files of all keys in one thread pool call instead of a call per file."""
+        return await asyncio.get_running_loop().run_in_executor(None, self._read_files, keys)
+
+    async def write_many(self, items: list) -> None:
+        """Write files of all pairs in one thread pool call, renamed as in write()."""
+        renames = [(f'{path}.{os.getpid()}.{next(self._temp_numbers)}.tmp', path)
+                   for path in (self.file_path(key) for key, _ in items)]
+        values = [value for _, value in items]
+        await asyncio.get_running_loop().run_in_executor(None, self._write_files, renames, values)
+        if self.durability == 'batched':  # Files are renamed after fsync with others.
+            await asyncio.gather(*(self._group.submit(rename) for rename in renames))
+
+    def _read_files(self, keys: list) -> list:
+        values = []
+        for key in keys:
+            try:
+                with open(self.file_path(key), 'r', encoding=ENCODING) as f:
+                    values.append(f.read())
+            except FileNotFoundError:
+                values.append(None)
+        return values
+
+    def _write_files(self, renames: list, values: list) -> None:
+        """Write temporary files, rename them unless they wait for group commit."""
+        try:
+            for (temp_path, _), value in zip(renames, values):
+                self._write_temp(temp_path, value, False)
+            if self.durability == 'per-write':
+                self._commit_files(renames)
+            elif self.durability == 'none':
+                for temp_path, path in renames:
+                    os.replace(temp_path, path)
+        except BaseException:
+            for temp_path, _ in renames:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            raise
+
+    @staticmethod
+    def _write_temp(temp_path: str, value: str, sync: bool) -> None:
+        with open(temp_path, 'w', encoding=ENCODING) as f:
+            f.write(value)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _write_file(self, temp_path: str, path: str, value: str) -> None:
+        """Write value with one open of file, fsync it and directory for per-write durability."""
+        sync = self.durability == 'per-write'
+        try:
+            self._write_temp(temp_path, value, sync)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        if sync:
+            _fsync_path(self.path)
+
+    def _commit_files(self, items: list) -> None:
+        """Fsync written temporary files, rename them and fsync directory once."""
+        renames = [item for item in items if item is not None]  # None is a delete.
+        try:
+            for temp_path, _ in renames:
+                _fsync_path(temp_path)
+            for temp_path, path in renames:
+                os.replace(temp_path, path)
+        except BaseException:
+            for temp_path, _ in renames:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            raise
+        _fsync_path(self.path)
+
+    async def _flush(self, items: list) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self._commit_files, items)
+
+    async def delete(self, key: str) -> bool:
+        try:
+            await remove(self.file_path(key))
+        except (FileExistsError, FileNotFoundError):
+            return False
+        if self.durability == 'batched':
+            await self._group.submit()
+        elif self.durability == 'per-write':
+            await asyncio.get_running_loop().run_in_executor(None, _fsync_path, self.path)
+        return True
+
+    async def keys(self) -> AsyncIterator[str]:
+        with os.scandir(self.path) as entries:
+            for number, entry in enumerate(entries, 1):
+                if entry.is_file() and '.' not in entry.name:  # Keys are base64, no dots.
+                    yield entry.name.replace('-', '/')
+                if not number % 1000:
+                    await asyncio.sleep(0)  # Let event loop process requests.
+
+    def stats(self) -> dict:
+        return self._group.stats() if self.durability == 'batched' else {}
+
+
+class LogStorage(Storage):
+    """Append-only single file storage with in-memory index.
+
+    Every write or delete appends a record to the data file, deletes are
+    stored as tombstone records. Index of values offsets is rebuilt by
+    reading the file on open, broken tail after crash is truncated.
+    Overwritten and deleted records are removed by background compaction.
+    File operations are made synchronously, they hit the page cache and are
+    cheaper than passing each of them to a thread pool.
+
+    Record: crc32, key length, value length, flags, key, value.
+
+    Args:
+        path(str): Directory for data file.
+        file_name(str): Data file name.
+        min_garbage(int): Min size of dead records in bytes to start compaction.
+        garbage_ratio(float): Min share of dead records in file to start compaction.
+        durability(str): One of DURABILITY_LEVELS.
+
+    """
+
+    CHEAP_MISSES = True
+    HEADER = struct.Struct('<IHIB')
+    TOMBSTONE = 1
+
+    def __init__(self, path: str = DB_PATH, file_name: str = LOG_STORAGE_FILE,
+                 min_garbage: int = COMPACTION_MIN_GARBAGE_BYTES,
+                 garbage_ratio: float = COMPACTION_GARBAGE_RATIO, durability: str = DURABILITY):
+        check_durability(durability)
+        self.path, self.durability = path, durability
+        self.file_path = os.path.join(path, file_name)
+        self.min_garbage, self.garbage_ratio = min_garbage, garbage_ratio
+        self._group = GroupCommit(lambda items: self._sync())
+        self._fd: Optional[int] = None
+        self._index: dict[str, tuple[int, int]] = {}  # key: (record offset, record size)
+        self._size, self._garbage = 0, 0
+        self._compaction: Optional[asyncio.Task] = None
+
+    async def open(self) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        if os.path.exists(self.file_path + '.compact'):
+            os.remove(self.file_path + '.compact')  # Compaction was interrupted.
+        self._fd = os.open(self.file_path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        self._index, self._size, self._garbage = {}, 0, 0
+        with open(self.file_path, 'rb') as f:
+            self._size, self._garbage = self._replay(f, 0, self._index)
+        file_size = os.fstat(self._fd).st_size
+        if file_size > self._size:
+            logger.warning(f'Storage {self.file_path}: broken tail of '
+                           f'{file_size - self._size} bytes is truncated')
+            os.ftruncate(self._fd, self._size)
+        logger.info(f'Storage {self.file_path}: {len(self._index)} keys, '
+                    f'{self._size} bytes, {self._garbage} bytes of garbage')
+
+    async def close(self) -> None:
+        await self._group.drain()
+        if self._compaction is not None:
+            await self._compaction
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    async def read(self, key: str) -> Optional[str]:
+        location = self._index.get(key)
+        if location is None:
+            return None
+        record = os.pread(self._fd, location[1], location[0])
+        key_size = len(key.encode(ENCODING))
+        return record[self.HEADER.size + key_size:].decode(ENCODING)
+
+    async def write(self, key: str, value: str) -> None:
+        self._append(key, value.encode(ENCODING))
+        await self._make_durable()
+
+    async def write_many(self, items: list) -> None:
+        """Append records of all pairs by one write."""
+        self._append_records([(key, value.encode(ENCODING), 0) for key, value in items])
+        await self._make_durable()
+
+    async def delete(self, key: str) -> bool:
+        if key not in self._index:
+            return False
+        self._append(key, b'', self.TOMBSTONE)
+        await self._make_durable()
+        return True
+
+    async def keys(self) -> AsyncIterator[str]:
+        for number, key in enumerate(list(self._index), 1):
+            if key in self._index:
+                yield key
+            if not number % 1000:
+                await asyncio.sleep(0)
+
+    def stats(self) -> dict:
+        """Return size of data file and share of dead records in it."""
+        stats = {'keys': len(self._index), 'bytes': self._size, 'garbage_bytes': self._garbage}
+        if self.durability == 'batched':
+            stats.update(self._group.stats())
+        return stats
+
+    async def _make_durable(self) -> None:
+        if self.durability == 'batched':
+            await self._group.submit()
+        elif self.durability == 'per-write':
+            await self._sync()
+
+    async def _sync(self) -> None:
+        """Fsync data file in thread pool, descriptor copy survives swap by compaction."""
+        fd = os.dup(self._fd)
+        await asyncio.get_running_loop().run_in_executor(None, _fsync_and_close, fd)
+
+    @classmethod
+    def _pack(cls, key: bytes, value: bytes, flags: int = 0) -> bytes:
+        body = cls.HEADER.pack(0, len(key), len(value), flags)[4:] + key + value
+        return struct.pack('<I', zlib.crc32(body)) + body
+
+    def _append(self, key: str, value: bytes, flags: int = 0) -> None:
+        self._append_records([(key, value, flags)])
+
+    def _append_records(self, records: list) -> None:
+        """Append list of (key, value, flags) records and update index."""
+        packed = [self._pack(key.encode(ENCODING), value, flags) for key, value, flags in records]
+        os.write(self._fd, b''.join(packed))
+        for (key, _, flags), record in zip(records, packed):
+            old = self._index.pop(key, None)
+            if old is not None:
+                self._garbage += old[1]
+            if flags & self.TOMBSTONE:
+                self._garbage += len(record)
+            else:
+                self._index[key] = (self._size, len(record))
+            self._size += len(record)
+        self._maybe_compact()
+
+    def _replay(self, f, offset: int, index: dict) -> tuple[int, int]:
+        """Apply records from file to index.
+
+        Args:
+            f: Data file opened in binary mode.
+            offset(int): Offset of the first record to apply.
+            index(dict): Index to update.
+        Returns:
+            tuple[int, int]: Offset after last correct record and size of dead records.
+
+        """
+        garbage = 0
+        f.seek(offset)
+        while True:
+            header = f.read(self.HEADER.size)
+            if len(header) < self.HEADER.size:
+                break
+            crc, key_size, value_size, flags = self.HEADER.unpack(header)
+            payload = f.read(key_size + value_size)
+            if len(payload) < key_size + value_size or zlib.crc32(header[4:] + payload) != crc:
+                break  # Record was not completely written.
+            key = payload[:key_size].decode(ENCODING)
+            record_size = self.HEADER.size + key_size + value_size
+            old = index.pop(key, None)
+            if old is not None:
+                garbage += old[1]
+            if flags & self.TOMBSTONE:
+                garbage += record_size
+            else:
+                index[key] = (offset, record_size)
+            offset += record_size
+        return offset, garbage
+
+    def _maybe_compact(self) -> None:
+        if self._compaction is not None or self._garbage < self.min_garbage:
+            return
+        if self._garbage / self._size < self.garbage_ratio:
+            return
+        self._compaction = asyncio.ensure_future(self.compact())
+        self._compaction.add_done_callback(self._compaction_done)
+
+    def _compaction_done(self, task: asyncio.Task) -> None:
+        self._compaction = None
+        if not task.cancelled() and task.exception() is not None:
+            logger.opt(exception=task.exception()).error(f'Storage {self.file_path}: compaction failed')
+
+    async def compact(self) -> None:
+        """Rewrite data file with live records only.
+
+        Live records are copied in chunks letting requests go on, records
+        appended meanwhile are copied after that, then files are swapped.
+
+        """
+        compact_path = self.file_path + '.compact'
+        start_size, new_index, new_size = self._size, {}, 0
+        new_fd = os.open(compact_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o644)
+        try:
+            for number, (key, (offset, size)) in enumerate(list(self._index.items()), 1):
+                os.write(new_fd, os.pread(self._fd, size, offset))
+                new_index[key] = (new_size, size)
+                new_size += size
+                if not number % 256:
+                    await asyncio.sleep(0)
+            await asyncio.get_running_loop().run_in_executor(None, os.fsync, new_fd)
+
+            # No awaits below, so the tail can't grow until files are swapped.
+            tail = os.pread(self._fd, self._size - start_size, start_size)
+            garbage = 0
+            if tail:
+                os.write(new_fd, tail)
+                with open(compact_path, 'rb') as f:
+                    _, garbage = self._replay(f, new_size, new_index)
+                if self.durability != 'none':
+                    os.fsync(new_fd)  # Tail writes could be reported durable by old file fsync.
+            os.replace(compact_path, self.file_path)
+        except BaseException:
+            os.close(new_fd)
+            os.remove(compact_path)
+            raise
+        logger.info(f'Storage {self.file_path}: compacted {self._size} to {new_size + len(tail)} bytes')
+        os.close(self._fd)
+        self._fd, self._index = new_fd, new_index
+        self._size, self._garbage = new_size + len(tail), garbage
+        if self.durability != 'none':
+            await asyncio.get_running_loop().run_in_executor(None, _fsync_path, self.path)
+
+
+STORAGE_BACKENDS = {
+    'files': FileStorage,
+    'log': LogStorage,
+}
+
+
+def create_storage(backend: str, path: str = DB_PATH) -> Storage:
+    """Create storage by backend name from STORAGE_BACKENDS in path directory."""
+    try:
+        return STORAGE_BACKENDS[backend](path)
+    except KeyError:
+        raise ValueError(f'Unknown storage backend: {backend}') from None
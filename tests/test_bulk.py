@@ -0,0 +1,32 @@
+"""Import stores the last record of a repeated name with parallel workers.
+
+Run: python -m pytest tests
+"""
+
+import io
+import tempfile
+import unittest
+
+from bulk import import_records
+from parse_data import make_uniq_id
+from storage import FileStorage
+
+
+class ImportTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_last_record_of_repeated_name_wins(self):
+        names = [f'user{number}' for number in range(5)]
+        rows = [(names[number % len(names)], str(number)) for number in range(2000)]
+        file = io.StringIO('name,phone\n' + ''.join(f'{name},{phone}\n' for name, phone in rows))
+        with tempfile.TemporaryDirectory() as path:
+            storage = FileStorage(path, 'none')
+            await storage.open()
+            await import_records(storage, file, 'csv', batch_size=50, workers=4)
+            values = await storage.read_many([make_uniq_id(name) for name in names])
+            await storage.close()
+        last = dict(rows)
+        self.assertEqual(values, [last[name] for name in names])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+"""Key filter has no false negatives for keys written while it is rebuilt.
+
+Run: python -m pytest tests
+"""
+
+import asyncio
+import unittest
+
+from key_filter import KeyFilter
+
+
+class SlowStorage:
+    """Storage whose files appear only after the filter scan, as with writes in executor."""
+
+    def __init__(self, keys: list):
+        self.written = list(keys)
+
+    async def keys(self):
+        for key in list(self.written):
+            await asyncio.sleep(0)
+            yield key
+
+
+class KeyFilterTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_keys_added_during_rebuild_are_kept(self):
+        storage = SlowStorage([f'old{number}' for number in range(10)])
+        key_filter = KeyFilter(storage, capacity=10, error_rate=0.01)
+        key_filter.start()
+        await key_filter._task
+        new_keys = [f'new{number}' for number in range(200)]
+        for key in new_keys:  # Concurrent writes, not in storage until the scan ends.
+            key_filter.add(key)
+        self.assertIsNotNone(key_filter._task)
+        await key_filter._task
+        self.assertGreater(key_filter.builds, 1)
+        for key in new_keys + storage.written:
+            self.assertTrue(key_filter.might_contain(key), key)
+
+
+if __name__ == '__main__':
+    unittest.main()
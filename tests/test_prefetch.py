@@ -0,0 +1,58 @@
+"""GET prefetch reads user within STORAGE_TIMEOUT and is measured as storage stage.
+
+Run: python -m pytest tests
+"""
+
+import asyncio
+import unittest
+from unittest import mock
+
+from admission import admission
+from config import PROTOCOL, ResponsePhrase
+from metrics import metrics
+import server
+
+
+REQUEST = f'ОТДОВАЙ Иван {PROTOCOL}\r\n\r\n'.encode()
+
+
+async def approve(request) -> bytes:
+    return server.APPROVED + f' {PROTOCOL}\r\n\r\n'.encode()
+
+
+def slow_get_user(seconds: float):
+    async def get_user(name: str, encoded_name: str) -> ResponsePhrase:
+        await asyncio.sleep(seconds)
+        return ResponsePhrase.N_FND
+    return get_user
+
+
+class PrefetchTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        for target, value in (('GET_PREFETCH', True), ('STORAGE_TIMEOUT', 0.2),
+                              ('cached_validation_request', approve)):
+            patcher = mock.patch.object(server, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_read_time_is_storage_stage(self):
+        histogram = metrics.latency[('storage', 'GET')]
+        count = histogram.count
+        with mock.patch.object(server, 'get_user', slow_get_user(0.05)):
+            response = await server.handle_request(REQUEST)
+        self.assertTrue(response[0].startswith(ResponsePhrase.N_FND.value.encode()))
+        self.assertEqual(histogram.count, count + 1)
+        self.assertGreaterEqual(histogram.total, 0.05)
+
+    async def test_slow_read_is_storage_timeout(self):
+        timeouts = dict(admission.timeouts)
+        with mock.patch.object(server, 'get_user', slow_get_user(1.0)):
+            response = await server.handle_request(REQUEST)
+        self.assertEqual(response, server.BUSY_RESPONSE)
+        self.assertEqual(admission.timeouts['storage'], timeouts['storage'] + 1)
+        self.assertEqual(admission.timeouts['validate'], timeouts['validate'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+"""Pooled connections to a keep-alive validation server keep requests and answers in step.
+
+Run: python -m pytest tests
+"""
+
+import asyncio
+import unittest
+
+from config import ENCODING, PROTOCOL, ResponsePhrase
+import validation
+
+
+class EchoValidator:
+    """Keep-alive validation server answering every frame with the frame in the comment.
+
+    Args:
+        extra_answers(int): Additional answers sent after every answer.
+
+    """
+
+    def __init__(self, extra_answers: int = 0):
+        self.extra_answers = extra_answers
+        self.frames: list = []
+
+    async def handle_connection(self, reader, writer) -> None:
+        try:
+            while True:
+                frame = await reader.readuntil(b'\r\n\r\n')
+                self.frames.append(frame)
+                answer = (f'{ResponsePhrase.APPR.value} {PROTOCOL}\r\n'.encode(ENCODING)
+                          + frame.replace(b'\r\n', b' ').strip() + b'\r\n\r\n')
+                writer.write(answer * (1 + self.extra_answers))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+class ValidationPoolTest(unittest.IsolatedAsyncioTestCase):
+
+    async def start_validator(self, validator: EchoValidator) -> None:
+        server = await asyncio.start_server(validator.handle_connection, '127.0.0.1', 0)
+        self.addAsyncCleanup(server.wait_closed)
+        self.addCleanup(server.close)
+        pool = validation.ValidationConnectionPool('127.0.0.1', server.sockets[0].getsockname()[1],
+                                                   size=1)
+        self.addAsyncCleanup(pool.close)
+        original_pool, validation.validation_pool = validation.validation_pool, pool
+        self.addCleanup(setattr, validation, 'validation_pool', original_pool)
+
+    async def test_answers_match_requests_on_reused_connection(self):
+        validator = EchoValidator()
+        await self.start_validator(validator)
+        for name in ('user1', 'user2', 'user3'):
+            request = f'ОТДОВАЙ {name} {PROTOCOL}\r\n\r\n'.encode(ENCODING)
+            response = await validation.validation_server_request(request)
+            self.assertIn(name.encode(ENCODING), response)
+            self.assertEqual(response.count(b'\r\n\r\n'), 1)
+        self.assertEqual(len(validator.frames), 3)  # One frame per request, no empty ones.
+
+    async def test_request_without_end_is_sent_as_one_frame(self):
+        validator = EchoValidator()
+        await self.start_validator(validator)
+        await validation.validation_server_request(f'ОТДОВАЙ user1 {PROTOCOL}'.encode(ENCODING))
+        self.assertEqual(validator.frames, [
+            f'АМОЖНА? {PROTOCOL}\r\nОТДОВАЙ user1 {PROTOCOL}\r\n\r\n'.encode(ENCODING)])
+
+    async def test_connection_with_unread_answers_is_not_reused(self):
+        validator = EchoValidator(extra_answers=1)
+        await self.start_validator(validator)
+        for name in ('user1', 'user2'):
+            request = f'ОТДОВАЙ {name} {PROTOCOL}\r\n\r\n'.encode(ENCODING)
+            await asyncio.sleep(0.05)  # Extra answer arrives while connection is idle.
+            response = await validation.validation_server_request(request)
+            self.assertIn(name.encode(ENCODING), response)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,36 +1,308 @@
 """Sends a validation request to validation server and receives answer, could be request processed or not."""
 import asyncio
+from typing import Awaitable, Callable, Optional
 
 from loguru import logger
 
-from config import PROTOCOL, ENCODING, VALIDATION_SERVER_URL, VALIDATION_SERVER_PORT
+from cache import LRUCache, MISSING
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from config import (PROTOCOL, ENCODING, VALIDATION_SERVER_URL, VALIDATION_SERVER_PORT,
+                    BREAKER_CALL_TIMEOUT, VALIDATION_POOL_SIZE, VALIDATION_POOL_ACQUIRE_TIMEOUT,
+                    VERDICT_CACHE_SIZE, VERDICT_CACHE_APPR_TTL, VERDICT_CACHE_N_APPR_TTL,
+                    VERDICT_CACHE_STALE_TTL, DEGRADED_POLICY, VALIDATOR_DOWN_COMMENT,
+                    RequestVerb, ResponsePhrase)
+from parse_data import RKSOKRequest, forms_response_chunks
 
 
-async def validation_server_request(message: str) -> str:
+APPROVED = ResponsePhrase.APPR.value.encode(ENCODING)
+NOT_APPROVED = ResponsePhrase.N_APPR.value.encode(ENCODING)
+VALIDATOR_DOWN_RESPONSE = b''.join(forms_response_chunks(
+    (ResponsePhrase.BUSY, VALIDATOR_DOWN_COMMENT)))  # НИЛЬЗЯ without validation server.
+
+
+class PoolTimeoutError(Exception):
+    """There is no free connection to validation server, it is local overload, not a failure."""
+
+
+class ValidationConnection:
+    """Opened connection to validation server."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader, self.writer = reader, writer
+
+    def is_alive(self) -> bool:
+        """Check the connection was not closed by any side."""
+        return not (self.writer.is_closing() or self.reader.at_eof())
+
+    def has_unread_data(self) -> bool:
+        """Check validation server sent more than answers which were read."""
+        return bool(self.reader._buffer)  # StreamReader has no public method for it.
+
+    async def close(self) -> None:
+        """Close connection and ignore errors of already dead socket."""
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+
+class ValidationConnectionPool:
+    """Bounded pool of reusable connections to validation server.
+
+    Args:
+        host(str): Validation server address.
+        port(int): Validation server port.
+        size(int): Max number of simultaneously opened connections.
+        acquire_timeout(float): Seconds to wait for a free connection.
+
+    """
+
+    def __init__(self, host: str, port: int, size: int = VALIDATION_POOL_SIZE,
+                 acquire_timeout: float = VALIDATION_POOL_ACQUIRE_TIMEOUT):
+        self.host, self.port = host, port
+        self.size, self.acquire_timeout = size, acquire_timeout
+        self._idle: list[ValidationConnection] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def acquire(self) -> tuple[ValidationConnection, bool]:
+        """Take idle connection from the pool or open a new one.
+
+        Returns:
+            tuple[ValidationConnection, bool]: Connection and flag is it reused or fresh.
+        Raises:
+            PoolTimeoutError: If there is no free connection during acquire_timeout.
+
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            raise PoolTimeoutError('No free connection to validation server') from None
+        try:
+            while self._idle:  # Health check, drop connections closed or out of step while idle.
+                connection = self._idle.pop()
+                if connection.is_alive() and not connection.has_unread_data():
+                    return connection, True
+                await connection.close()
+            return await self._open_connection(), False
+        except BaseException:
+            self._slots.release()
+            raise
+
+    async def release(self, connection: ValidationConnection, reusable: bool = True) -> None:
+        """Return connection to the pool or close it if it can't be reused."""
+        try:
+            if reusable and connection.is_alive():
+                self._idle.append(connection)
+            else:
+                await connection.close()
+        finally:
+            self._slots.release()
+
+    async def close(self) -> None:
+        """Close all idle connections."""
+        while self._idle:
+            await self._idle.pop().close()
+
+    async def _open_connection(self) -> ValidationConnection:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        return ValidationConnection(reader, writer)
+
+    async def request(self, request: bytes, timeout: Optional[float] = None) -> bytes:
+        """Send request through pooled connection and return raw response.
+
+        If reused connection was closed by validation server, request is
+        repeated once through a fresh connection.
+
+        Args:
+            request(bytes): Encoded request to validation server.
+            timeout(Optional[float]): Seconds for answer, wait for a free connection is not counted.
+        Returns:
+            (bytes): Raw response from validation server.
+        Raises:
+            PoolTimeoutError: If there is no free connection during acquire_timeout.
+            asyncio.TimeoutError: If validation server doesn't answer during timeout.
+
+        """
+        while True:
+            connection, reused = await self.acquire()
+            try:
+                response = await asyncio.wait_for(self._exchange(connection, request), timeout)
+            except (ConnectionError, OSError):
+                await self.release(connection, reusable=False)
+                if reused:
+                    continue  # Stale connection, validator closed it while idle.
+                raise
+            except BaseException:
+                await self.release(connection, reusable=False)
+                raise
+            if not response and reused:
+                await self.release(connection, reusable=False)
+                continue  # Validator closed reused connection without answer.
+            await self.release(connection, reusable=response.endswith(b'\r\n\r\n')
+                               and not connection.has_unread_data())
+            return response
+
+    @staticmethod
+    async def _exchange(connection: ValidationConnection, request: bytes) -> bytes:
+        """Send one request and read exactly one answer, the next one belongs to the next request."""
+        connection.writer.write(request)
+        await connection.writer.drain()
+        try:
+            return await connection.reader.readuntil(b'\r\n\r\n')
+        except asyncio.IncompleteReadError as error:
+            return error.partial  # Validation server closed connection.
+        except asyncio.LimitOverrunError:
+            raise ConnectionResetError('Validation server answer is too long') from None
+
+
+class VerdictCache:
+    """Cache of validation server verdicts with coalescing of identical requests.
+
+    Verdicts are also kept for stale_ttl seconds to be used when validation
+    server is down.
+
+    Args:
+        size(int): Max number of cached verdicts.
+        appr_ttl(float): Seconds to keep МОЖНА verdicts.
+        n_appr_ttl(float): Seconds to keep НИЛЬЗЯ verdicts.
+        stale_ttl(float): Seconds to keep verdicts for get_stale(), 0 disables it.
+
+    """
+
+    def __init__(self, size: int = VERDICT_CACHE_SIZE, appr_ttl: float = VERDICT_CACHE_APPR_TTL,
+                 n_appr_ttl: float = VERDICT_CACHE_N_APPR_TTL,
+                 stale_ttl: float = VERDICT_CACHE_STALE_TTL):
+        self.appr_ttl, self.n_appr_ttl, self.stale_ttl = appr_ttl, n_appr_ttl, stale_ttl
+        self._verdicts = LRUCache(size)
+        self._stale = LRUCache(size if stale_ttl > 0 else 0)
+        self._in_flight: dict[tuple, asyncio.Task] = {}
+        self.coalesced = 0
+
+    @staticmethod
+    def make_key(verb: RequestVerb, name: str, request_body: str) -> tuple:
+        """Normalize request to a cache key."""
+        return (verb.value, name, request_body.strip('\r\n'))
+
+    async def get_verdict(self, key: tuple, request: Callable[[], Awaitable[bytes]]) -> bytes:
+        """Return cached verdict or request it, sharing one request between equal keys.
+
+        Args:
+            key(tuple): Normalized request from make_key().
+            request(Callable[[], Awaitable[bytes]]): Makes request to validation server.
+        Returns:
+            (bytes): Response from validation server.
+
+        """
+        verdict = self._verdicts.get(key)
+        if verdict is not MISSING:
+            return verdict
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(request())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._store(key, done))
+        return await asyncio.shield(task)  # Cancelled caller should not cancel others.
+
+    def get_stale(self, key: tuple) -> Optional[bytes]:
+        """Return the last verdict for key even if it is not fresh, None if there is no one."""
+        verdict = self._stale.get(key, count=False)
+        return None if verdict is MISSING else verdict
+
+    def invalidate(self, key: tuple) -> None:
+        """Forget cached verdict."""
+        self._verdicts.pop(key)
+        self._stale.pop(key)
+
+    def stats(self) -> dict:
+        """Return hit, miss and coalesce counters."""
+        return {**self._verdicts.stats(), 'coalesced': self.coalesced,
+                'in_flight': len(self._in_flight)}
+
+    def _store(self, key: tuple, task: asyncio.Task) -> None:
+        self._in_flight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return  # Nothing to cache, exception is retrieved by awaiting callers.
+        verdict = task.result()
+        if verdict.startswith(APPROVED):
+            ttl = self.appr_ttl
+        elif verdict.startswith(NOT_APPROVED):
+            ttl = self.n_appr_ttl
+        else:
+            return  # Unknown response from validation server.
+        if ttl > 0:
+            self._verdicts.set(key, verdict, ttl=ttl)
+        self._stale.set(key, verdict, ttl=self.stale_ttl)
+
+
+validation_pool = ValidationConnectionPool(VALIDATION_SERVER_URL, VALIDATION_SERVER_PORT)
+verdict_cache = VerdictCache()
+validation_breaker = CircuitBreaker('validation server', call_timeout=None)  # Pool times answers.
+degraded_stats = {'fail_fast': 0, 'stale_verdicts': 0}
+VALIDATION_REQUEST_HEADER = f"АМОЖНА? {PROTOCOL}\r\n".encode(ENCODING)
+
+
+async def validation_server_request(message: bytes) -> bytes:
     """Sends request to validation server and return server response.
 
     Args:
-        message(str): Request from client.
+        message(bytes): Raw request from client, with or without end of request.
+    Returns:
+        (bytes): Raw response from validation server.
+
+    """
+    # One end of request only, extra one is an empty request to validator on the same connection.
+    request = b''.join((VALIDATION_REQUEST_HEADER, message.rstrip(b'\r\n'), b'\r\n\r\n'))
+    response = await validation_pool.request(request, BREAKER_CALL_TIMEOUT)
+    logger.debug('\nREQUEST_TO_VALIDATION_SERVER:\n{}', request)
+    logger.debug('\nRESPONSE_FROM_VALIDATION_SERVER:\n{}', response)
+    if not response:
+        raise ConnectionResetError('Validation server closed connection without verdict')
+
+    return response
+
+
+def degraded_verdict(request: RKSOKRequest, key: tuple) -> bytes:
+    """Return verdict by DEGRADED_POLICY when validation server can't answer.
+
+    "fail_fast" answers НИЛЬЗЯ to all requests, "cached_get" lets GET go
+    with the last known verdict of the same request and answers НИЛЬЗЯ to
+    others.
+
+    """
+    if DEGRADED_POLICY == 'cached_get' and request.verb == RequestVerb.GET:
+        verdict = verdict_cache.get_stale(key)
+        if verdict is not None:
+            degraded_stats['stale_verdicts'] += 1
+            return verdict
+    degraded_stats['fail_fast'] += 1
+    return VALIDATOR_DOWN_RESPONSE
+
+
+async def cached_validation_request(request: RKSOKRequest) -> bytes:
+    """Return verdict of validation server for request from cache or from validation server.
+
+    Validation server is called through circuit breaker, if it fails or the
+    breaker is open verdict is made by degraded_verdict().
+
+    Args:
+        request(RKSOKRequest): Parsed request from client.
     Returns:
-        (str): Decoded response from validation server.
+        (bytes): Raw response from validation server.
+    Raises:
+        asyncio.TimeoutError: If there is no free connection to validation server.
 
     """
-    reader, writer = await asyncio.open_connection(
-        VALIDATION_SERVER_URL, VALIDATION_SERVER_PORT)
-
-    request = f"АМОЖНА? {PROTOCOL}\r\n{message}\r\n\r\n".encode(ENCODING)
-    writer.write(request)
-    await writer.drain()
-
-    response = b''
-    while True:  # reading all data from validation server by 1kb blocks
-        line = await reader.read(1024)
-        response += line
-        if response.endswith(b'\r\n\r\n') or not line:
-            break
-    writer.close()
-    await writer.wait_closed()
-    logger.debug(f'\nREQUEST_TO_VALIDATION_SERVER:\n{request}')
-    logger.debug(f'\nRESPONSE_FROM_VALIDATION_SERVER:\n{response.decode(ENCODING)}')
-   
-    return response.decode(ENCODING)
+    key = VerdictCache.make_key(request.verb, request.name, request.body)
+    try:
+        return await verdict_cache.get_verdict(key, lambda: validation_breaker.call(
+            lambda: validation_server_request(request.raw)))
+    except PoolTimeoutError:
+        raise asyncio.TimeoutError from None  # Server is busy, answered like other timeouts.
+    except (CircuitOpenError, OSError, asyncio.TimeoutError) as error:
+        logger.debug('Validation server is unavailable: {!r}', error)
+        return degraded_verdict(request, key)
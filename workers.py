@@ -0,0 +1,88 @@
+"""Runs server in several worker processes and restarts crashed ones."""
+
+import os
+import signal
+import time
+from typing import Callable
+
+from loguru import logger
+
+from config import WORKER_RESTART_DELAY, WORKER_SHUTDOWN_TIMEOUT
+
+
+def _spawn(worker: Callable[[int], None], number: int) -> int:
+    """Fork worker process and return its pid."""
+    pid = os.fork()
+    if pid:
+        return pid
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)  # Handlers of supervisor are not for worker.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Supervisor stops workers by SIGTERM.
+    signal.signal(signal.SIGUSR1, signal.SIG_IGN)  # Until server sets its handler.
+    exit_code = 1
+    try:
+        worker(number)
+        exit_code = 0
+    except BaseException:
+        logger.exception('Worker crashed')
+    finally:
+        logger.remove()  # Flush log sinks, os._exit() skips atexit handlers.
+        os._exit(exit_code)
+
+
+def run_workers(workers: int, worker: Callable[[int], None]) -> None:
+    """Supervise worker processes until SIGTERM or SIGINT.
+
+    Crashed workers are restarted after WORKER_RESTART_DELAY seconds. On
+    shutdown all workers get SIGTERM and are killed if they are still alive
+    after WORKER_SHUTDOWN_TIMEOUT seconds. SIGUSR1 is passed to all workers.
+
+    Args:
+        workers(int): Number of worker processes.
+        worker(Callable[[int], None]): Function running server in worker process,
+            gets worker number, restarted worker gets number of crashed one.
+
+    """
+    children = {}  # pid: worker number
+    stop_requested = []
+
+    def stop(signum, frame):
+        if not stop_requested:
+            logger.info(f'Stopping {len(children)} workers')
+            stop_requested.append(time.monotonic())
+            for pid in children:
+                os.kill(pid, signal.SIGTERM)
+
+    def forward(signum, frame):
+        for pid in children:
+            os.kill(pid, signum)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGUSR1, forward)
+    for number in range(workers):
+        children[_spawn(worker, number)] = number
+    logger.info(f'Started {workers} workers: {list(children)}')
+
+    restarts = []  # Time of restart and number of crashed workers.
+    while children or restarts:
+        pid = 0
+        if children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid in children:
+            number = children.pop(pid)
+            if not stop_requested:
+                logger.error(f'Worker {pid} exited with code {os.waitstatus_to_exitcode(status)}')
+                restarts.append((time.monotonic() + WORKER_RESTART_DELAY, number))
+        if stop_requested:
+            restarts.clear()
+            if time.monotonic() - stop_requested[0] > WORKER_SHUTDOWN_TIMEOUT:
+                for child in children:
+                    os.kill(child, signal.SIGKILL)
+        while restarts and restarts[0][0] <= time.monotonic():
+            _, number = restarts.pop(0)
+            new_pid = _spawn(worker, number)
+            children[new_pid] = number
+            logger.info(f'Worker {new_pid} started instead of crashed one')
+        if not pid:
+            time.sleep(0.1)
+    logger.info('All workers stopped')